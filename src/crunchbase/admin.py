@@ -1,3 +1,11 @@
 from django.contrib import admin
+from crunchbase.models import Organization, Product
 
-# Register your models here.
+
+class MirroredItemAdmin(admin.ModelAdmin):
+    list_display = ('name', 'path', 'position')
+    search_fields = ('name',)
+
+
+admin.site.register(Organization, MirroredItemAdmin)
+admin.site.register(Product, MirroredItemAdmin)
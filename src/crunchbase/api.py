@@ -0,0 +1,93 @@
+"""
+JSON API for jobs that need whole result sets: the items are streamed as NDJSON (one JSON object per line) straight from
+the upstream pages, so that an export of a whole subset takes as much memory as a few pages.
+"""
+import itertools
+import json
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.generic.base import View
+from crunchbase import upstream
+from crunchbase.fields import FIELD_EXTRACTORS, project_fields
+from crunchbase.models import MIRROR_MODELS
+from crunchbase.views import CrunchbaseEndpoint, CrunchbaseQuery, LIST_ITEM_FIELDS, fetch_details, get_export_pool, \
+    use_mirror
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+class CrunchbaseExportView(View):
+    """
+    Streams the items of a subset, or of a search, as NDJSON, eg.
+
+        /api/companies/?query=web&fields=properties__short_description,primary_image&cursor=2000&limit=500
+
+    fields are the registered detail fields to add to the list fields, cursor is the index of the first item and limit
+    the maximum number of items.
+    """
+    content_type = 'application/x-ndjson'
+
+    def get(self, request, subset):
+        fields = [f for f in request.GET.get('fields', '').split(',') if f]
+        unknown = [f for f in fields if f not in FIELD_EXTRACTORS]
+        if unknown:
+            return JsonResponse({'error': 'Unknown fields: %s' % ', '.join(unknown)}, status=400)
+        try:
+            start = int(request.GET.get('cursor', 0))
+            limit = int(request.GET['limit']) if request.GET.get('limit') else None
+        except ValueError:
+            return JsonResponse({'error': 'cursor and limit must be integers'}, status=400)
+        if start < 0 or (limit is not None and limit < 0):
+            return JsonResponse({'error': 'cursor and limit must not be negative'}, status=400)
+        query = request.GET.get('query')
+        if use_mirror():
+            lines = self.mirror_lines(subset, query, fields, start, limit)
+        else:
+            endpoint = getattr(CrunchbaseQuery(), subset)
+            queryset = endpoint.datastore.search(query) if query else endpoint.datastore
+            items = queryset.iter_items(start)
+            try:  # The first page is read before the response starts, so that errors still get their status
+                first = next(items)
+            except StopIteration:
+                first = None
+            except upstream.RateLimitExceeded:
+                return JsonResponse({'error': 'The upstream API is busy, try again later'}, status=503)
+            items = itertools.chain([first] if first is not None else [], items)
+            lines = self.lines(itertools.islice(items, limit), fields)
+        return StreamingHttpResponse(lines, content_type=self.content_type)
+
+    def lines(self, items, fields):
+        """
+        :param items: iterable of projected list items
+        :param fields: names of the detail fields to add
+        :return: :rtype: generator of str
+        """
+        # The details of a batch are fetched together by the export pool, in the background priority so that the pages
+        # come first
+        for batch in batches(items, getattr(settings, 'CRUNCHBASE_EXPORT_BATCH_SIZE', 50)):
+            details = {}
+            if fields:
+                with upstream.priority(upstream.PREFETCH):
+                    details = fetch_details(CrunchbaseEndpoint.BASE_URI, [item['path'] for item in batch],
+                                            pool=get_export_pool())
+            yield ''.join(self.serialize(item, details.get(item['path']), fields) for item in batch)
+
+    def mirror_lines(self, subset, query, fields, start, limit):
+        objects = MIRROR_MODELS[CrunchbaseQuery.ENDPOINTS[subset]].objects
+        queryset = objects.search(query) if query else objects.all()
+        queryset = queryset[start:start + limit] if limit is not None else queryset[start:]
+        for obj in queryset.iterator():
+            yield self.serialize(obj, obj.get_detail() if fields else None, fields)
+
+    def serialize(self, item, detail, fields):
+        data = dict((k, item[k]) for k in LIST_ITEM_FIELDS)
+        if fields:
+            data.update(project_fields(detail, fields))
+        return json.dumps(data) + '\n'
@@ -0,0 +1,156 @@
+"""
+Load generator for the search, home and detail views: a number of client threads request a weighted mix of pages, as
+fast as the app serves them, for a given time; the app runs in-process under waitress, with the upstream replaced by
+the stub server, so that the upstream calls and the cache hits can be counted too.
+"""
+import random
+import threading
+import time
+import requests
+from waitress.server import create_server
+from crunchbase.benchmarks.micro import percentile
+from crunchbase.benchmarks.stub_server import NAME_WORDS
+from crunchbase.tiered_cache import cache
+
+# Relative weights of the kinds of request
+DEFAULT_MIX = {
+    'home': 1,
+    'list': 3,
+    'search': 3,
+    'detail': 3,
+}
+
+
+def popular_number(limit, mean=20.0):
+    # Most of the requests are for the first pages and items, as in real traffic
+    return min(int(random.expovariate(1 / mean)), limit - 1)
+
+
+def random_path(kind, total_items, per_page=10):
+    """
+    :param kind: one of the keys of DEFAULT_MIX
+    :param total_items: number of items of each subset in the stub server
+    :return: :rtype: str path and query of a request of that kind
+    """
+    subset = random.choice(('companies', 'products'))
+    if kind == 'home':
+        return '/search/'
+    if kind == 'list':
+        return '/search/%s/?page=%s' % (subset, popular_number(total_items // per_page) + 1)
+    if kind == 'search':
+        return '/search/%s/?query=%s&page=%s' % (subset, random.choice(NAME_WORDS), popular_number(10) + 1)
+    return '/detail/%s/item-%s/' % (random.choice(('organization', 'product')), popular_number(total_items))
+
+
+class LoadGenerator(object):
+    def __init__(self, base_url, concurrency=10, duration=30, mix=None, total_items=5000):
+        """
+        :param base_url: url of the running app, without trailing slash
+        :param concurrency: number of client threads
+        :param duration: seconds to run for
+        :param mix: dict of weights by kind of request, defaults to DEFAULT_MIX
+        :param total_items: number of items of each subset, to pick the pages and the details
+        """
+        self.base_url = base_url
+        self.concurrency = concurrency
+        self.duration = duration
+        self.mix = mix or DEFAULT_MIX
+        self.total_items = total_items
+        self.results = []  # (kind, status code, seconds)
+        self._lock = threading.Lock()
+
+    def pick_kind(self):
+        point = random.uniform(0, sum(self.mix.values()))
+        for kind, weight in sorted(self.mix.items()):
+            point -= weight
+            if point <= 0:
+                return kind
+        return kind
+
+    def client(self, deadline):
+        session = requests.Session()
+        results = []
+        while time.time() < deadline:
+            kind = self.pick_kind()
+            start = time.time()
+            try:
+                status = session.get(self.base_url + random_path(kind, self.total_items)).status_code
+            except requests.RequestException:
+                status = None
+            results.append((kind, status, time.time() - start))
+        with self._lock:
+            self.results.extend(results)
+
+    def run(self):
+        """
+        :return: :rtype: float seconds actually elapsed
+        """
+        start = time.time()
+        clients = [threading.Thread(target=self.client, args=(start + self.duration,)) for i in range(self.concurrency)]
+        for t in clients:
+            t.start()
+        for t in clients:
+            t.join()
+        return time.time() - start
+
+
+def summarize(results, elapsed):
+    """
+    :param results: list of (kind, status code, seconds)
+    :param elapsed: seconds the load lasted
+    :return: :rtype: dict with throughput and latency percentiles, overall and by kind
+    """
+    def stats(entries):
+        timings = sorted(seconds * 1000 for kind, status, seconds in entries)
+        if not timings:
+            return {'requests': 0}
+        return {
+            'requests': len(timings),
+            'errors': len([e for e in entries if e[1] != 200]),
+            'throughput_rps': len(timings) / float(elapsed),
+            'p50_ms': percentile(timings, 0.5),
+            'p95_ms': percentile(timings, 0.95),
+            'p99_ms': percentile(timings, 0.99),
+            'max_ms': timings[-1],
+        }
+
+    summary = stats(results)
+    summary['by_kind'] = dict((kind, stats([r for r in results if r[0] == kind]))
+                              for kind in set(r[0] for r in results))
+    return summary
+
+
+def run_in_process(application, server, concurrency=10, duration=30, threads=4, mix=None):
+    """
+    Serves the app with waitress on a free port and puts it under load
+
+    :param application: WSGI application
+    :param server: running StubCrunchbaseServer, already set up with stub_upstream
+    :param threads: number of waitress worker threads
+    :return: :rtype: dict with the load summary, the upstream calls per request and the cache hit ratio
+    """
+    app_server = create_server(application, map={}, host='127.0.0.1', port=0, threads=threads)
+    thread = threading.Thread(target=app_server.run, name='waitress')
+    thread.daemon = True
+    thread.start()
+    try:
+        generator = LoadGenerator('http://127.0.0.1:%s' % app_server.effective_port, concurrency, duration, mix,
+                                  server.total_items)
+        server.reset_calls()
+        cache.reset_hits()
+        elapsed = generator.run()
+        upstream_calls, hits = server.reset_calls(), cache.reset_hits()
+    finally:
+        app_server.task_dispatcher.shutdown()
+        app_server.close()
+    summary = summarize(generator.results, elapsed)
+    lookups = sum(hits.values())
+    summary.update({
+        'concurrency': concurrency,
+        'threads': threads,
+        'upstream_latency_ms': server.latency * 1000,
+        'upstream_calls_per_request': upstream_calls / float(max(summary['requests'], 1)),
+        'cache_hit_ratio': (hits['l1'] + hits['l2']) / float(lookups) if lookups else None,
+        'cache_lookups': hits,
+    })
+    return summary
@@ -0,0 +1,129 @@
+"""
+Microbenchmarks of the hot paths, run against the stub server: decoding and projecting the upstream responses, the
+cache round trips, and the endpoint and queryset methods used by the views, both with a cold and a warm cache.
+"""
+from functools import partial
+import json
+import platform
+import StringIO
+import sys
+import time
+from crunchbase.tiered_cache import cache
+from crunchbase.views import CrunchbaseEndpoint, CrunchbaseQueryset, project_detail, project_list_page, \
+    stream_list_page, ijson
+
+FETCH_VALUES = ('properties__short_description', 'primary_image')
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(int(len(sorted_values) * fraction), len(sorted_values) - 1)]
+
+
+def measure(func, repeat, setup=None):
+    """
+    :param func: callable to time
+    :param repeat: number of timed calls
+    :param setup: callable run before each call, not timed
+    :return: :rtype: dict of timings in milliseconds
+    """
+    timings = []
+    for i in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.time()
+        func()
+        timings.append((time.time() - start) * 1000)
+    timings.sort()
+    return {
+        'repeat': repeat,
+        'min_ms': timings[0],
+        'median_ms': percentile(timings, 0.5),
+        'mean_ms': sum(timings) / len(timings),
+        'p95_ms': percentile(timings, 0.95),
+        'max_ms': timings[-1],
+    }
+
+
+def get_benchmarks(server):
+    """
+    :param server: running StubCrunchbaseServer, already set up with stub_upstream
+    :return: :rtype: list of (name, func, setup)
+    """
+    list_body = server.list_body('organizations', 1)
+    detail_body = server.detail_body('organization', 'item-1')
+    list_json, detail_json = json.loads(list_body), json.loads(detail_body)
+    projected_page = project_list_page(list_json)
+    companies, products = CrunchbaseEndpoint('organizations'), CrunchbaseEndpoint('products')
+    path = projected_page['data']['items'][0]['path']
+
+    def queryset_slice(uri, start, stop):
+        return CrunchbaseQueryset(dataset_uri=CrunchbaseEndpoint.BASE_URI + uri)[start:stop]
+
+    def search(endpoint, term):
+        return list(endpoint.datastore.search(term)[:10])
+
+    benchmarks = [
+        ('json_decode_list_page', partial(json.loads, list_body), None),
+        ('json_decode_detail', partial(json.loads, detail_body), None),
+        ('project_list_page', partial(project_list_page, list_json), None),
+        ('project_detail', partial(project_detail, detail_json), None),
+        ('cache_set_list_page', partial(cache.set, 'benchmark-page', projected_page), None),
+        ('cache_get_list_page_l1', partial(cache.get, 'benchmark-page'), None),
+        ('cache_get_list_page_l2', lambda: cache.backend.get('benchmark-page'), None),
+        ('endpoint_list_cold', partial(companies.list, fetch_values=FETCH_VALUES), cache.clear),
+        ('endpoint_list_warm', partial(companies.list, fetch_values=FETCH_VALUES), None),
+        ('fetch_item_values_cold', partial(companies.fetch_item_values, path, FETCH_VALUES), cache.clear),
+        ('fetch_item_values_warm', partial(companies.fetch_item_values, path, FETCH_VALUES), None),
+        ('queryset_getitem_cold', partial(queryset_slice, 'organizations', 0, 10), cache.clear),
+        ('queryset_getitem_warm', partial(queryset_slice, 'organizations', 0, 10), None),
+        ('queryset_getitem_cross_page_warm', partial(queryset_slice, 'organizations', 995, 1005), None),
+        ('queryset_search_upstream_cold', partial(search, companies, 'cloud data'), cache.clear),
+        ('queryset_search_upstream_warm', partial(search, companies, 'cloud data'), None),
+        ('queryset_search_local', partial(search, products, 'cloud data'), partial(products.list, per_page=1)),
+    ]
+    if ijson is not None:
+        benchmarks.insert(1, ('stream_list_page', lambda: stream_list_page(StringIO.StringIO(list_body)), None))
+    return benchmarks
+
+
+def run(server, repeat=20, only=None):
+    """
+    :param server: running StubCrunchbaseServer, already set up with stub_upstream
+    :param repeat: number of timed calls of each benchmark
+    :param only: names of the benchmarks to run, all of them by default
+    :return: :rtype: dict, ready to be dumped as JSON
+    """
+    results = {}
+    for name, func, setup in get_benchmarks(server):
+        if only and name not in only:
+            continue
+        func()  # Warm up, and fill the cache for the warm variants
+        server.reset_calls()
+        results[name] = measure(func, repeat, setup)
+        results[name]['upstream_calls'] = server.reset_calls() / float(repeat)
+    return {
+        'metadata': {
+            'timestamp': time.time(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'ijson': ijson is not None,
+            'latency_ms': server.latency * 1000,
+            'items_per_page': server.items_per_page,
+        },
+        'benchmarks': results,
+    }
+
+
+def compare(results, baseline, tolerance=0.2, statistic='median_ms'):
+    """
+    :param results: output of run()
+    :param baseline: output of a previous run()
+    :param tolerance: fraction by which a benchmark can be slower than the baseline
+    :return: :rtype: list of (name, baseline value, new value) of the benchmarks that got slower
+    """
+    regressions = []
+    for name, timings in sorted(results['benchmarks'].items()):
+        previous = baseline['benchmarks'].get(name)
+        if previous and timings[statistic] > previous[statistic] * (1 + tolerance):
+            regressions.append((name, previous[statistic], timings[statistic]))
+    return regressions
@@ -0,0 +1,159 @@
+"""
+Local stand-in for the Crunchbase API, serving list pages and details built from the recorded fixtures, with a
+configurable latency; it's used by the benchmarks and the load tests, so that their numbers don't depend on the network
+or on the API quota.
+"""
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from contextlib import contextmanager
+from SocketServer import ThreadingMixIn
+import copy
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import urlparse
+from django.conf import settings
+from django.test.utils import override_settings
+from crunchbase import upstream
+from crunchbase.tiered_cache import cache
+from crunchbase.views import CrunchbaseEndpoint
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+# Words the generated names are made of, so that searches have something to match
+NAME_WORDS = ('web', 'tools', 'cloud', 'data', 'mobile', 'social', 'health', 'energy', 'labs', 'media', 'games', 'pay')
+ITEM_TYPES = {'organizations': ('organization', 'Organization'), 'products': ('product', 'Product')}
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name)) as f:
+        return json.load(f)
+
+
+def item_name(number):
+    return '%s %s %s' % (NAME_WORDS[number % len(NAME_WORDS)].title(),
+                         NAME_WORDS[(number // len(NAME_WORDS)) % len(NAME_WORDS)].title(), number)
+
+
+class StubCrunchbaseServer(ThreadingMixIn, HTTPServer):
+    """
+    Serves `total_items` generated items for each list endpoint, `items_per_page` at a time like the API does, and a
+    detail for any of their paths; every response is delayed by `latency` seconds.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 128
+
+    def __init__(self, port=0, latency=0.05, total_items=5000, items_per_page=1000):
+        HTTPServer.__init__(self, ('127.0.0.1', port), StubRequestHandler)
+        self.latency = latency
+        self.total_items = total_items
+        self.items_per_page = items_per_page
+        self.base_uri = 'http://127.0.0.1:%s/v/2/' % self.server_address[1]
+        self.list_fixture = load_fixture('list_page.json')
+        self.detail_fixture = load_fixture('detail.json')
+        self.calls = 0
+        self._calls_lock = threading.Lock()
+        self._bodies = {}  # Rendered list pages, so that the stub is never the bottleneck
+        self._thread = None
+
+    def count_call(self):
+        with self._calls_lock:
+            self.calls += 1
+
+    def reset_calls(self):
+        with self._calls_lock:
+            calls, self.calls = self.calls, 0
+        return calls
+
+    def metadata(self):
+        return dict(self.list_fixture['metadata'], api_path_prefix=self.base_uri)
+
+    def list_body(self, uri, page, query=None):
+        key = (uri, page, query)
+        if key not in self._bodies:
+            type_path, type_name = ITEM_TYPES[uri]
+            numbers = range(self.total_items)
+            if query:
+                words = query.lower().split()
+                numbers = [n for n in numbers if all(w in item_name(n).lower() for w in words)]
+            number_of_pages = max((len(numbers) + self.items_per_page - 1) // self.items_per_page, 1)
+            template = self.list_fixture['data']['items'][0]
+            items = [dict(template, name=item_name(n), path='%s/item-%s' % (type_path, n), type=type_name)
+                     for n in numbers[(page - 1) * self.items_per_page:page * self.items_per_page]]
+            paging = dict(self.list_fixture['data']['paging'], current_page=page, items_per_page=self.items_per_page,
+                          number_of_pages=number_of_pages, total_items=len(numbers),
+                          next_page_url=self.base_uri + '%s?page=%s' % (uri, page + 1) if page < number_of_pages else None,
+                          prev_page_url=self.base_uri + '%s?page=%s' % (uri, page - 1) if page > 1 else None)
+            self._bodies[key] = json.dumps({'metadata': self.metadata(), 'data': {'items': items, 'paging': paging}})
+        return self._bodies[key]
+
+    def detail_body(self, type_path, permalink):
+        detail = copy.deepcopy(self.detail_fixture)
+        number = int(permalink.rsplit('-', 1)[-1]) if permalink.rsplit('-', 1)[-1].isdigit() else 0
+        detail['metadata'] = self.metadata()
+        detail['data']['type'] = ITEM_TYPES.get(type_path + 's', (None, 'Organization'))[1]
+        detail['data']['properties'].update(name=item_name(number), permalink=permalink)
+        return json.dumps(detail)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name='stub-crunchbase')
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class StubRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive, as the real API
+
+    def do_GET(self):
+        self.server.count_call()
+        time.sleep(self.server.latency)
+        url = urlparse.urlparse(self.path)
+        params = urlparse.parse_qs(url.query)
+        path = url.path.split('/v/2/', 1)[-1].strip('/')
+        if path in ITEM_TYPES:
+            body = self.server.list_body(path, int(params.get('page', ['1'])[0]), params.get('query', [None])[0])
+        elif path.count('/') == 1:
+            body = self.server.detail_body(*path.split('/'))
+        else:
+            body = json.dumps({'metadata': self.server.metadata(), 'data': {'error': {'message': 'Not found'}}})
+        self.send_response(200)  # Errors included, as the API does
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@contextmanager
+def stub_upstream(server, rate_limit=1000):
+    """
+    Points the endpoints to a running stub server within the block, with an empty cache of the same kind as the
+    configured one (in a temporary directory) and a rate limit suitable for a local server. Threads that already used
+    the cache keep their backend, so this is meant for processes that only run benchmarks.
+    """
+    cache_dir = tempfile.mkdtemp(prefix='crunchbase-benchmark-')
+    cache_settings = dict(settings.CACHES['default'], LOCATION=cache_dir)
+    base_uri = CrunchbaseEndpoint.BASE_URI
+    CrunchbaseEndpoint.BASE_URI = server.base_uri
+    try:
+        with override_settings(CACHES={'default': cache_settings}, CRUNCHBASE_RATE_LIMIT=rate_limit,
+                               CRUNCHBASE_RATE_BURST=rate_limit):
+            upstream._limiter = None  # Rebuilt with the settings above
+            cache.clear()
+            try:
+                yield server
+            finally:
+                cache.clear()
+                upstream._limiter = None
+    finally:
+        CrunchbaseEndpoint.BASE_URI = base_uri
+        shutil.rmtree(cache_dir, ignore_errors=True)
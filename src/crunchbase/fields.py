@@ -0,0 +1,60 @@
+"""
+Registry of the detail fields that can be requested for list items.
+
+Fields are named after their `__`-separated path inside the detail data (eg. properties__short_description is
+detail['data']['properties']['short_description']), unless they are registered with their own extractor; the
+extractors are built once, when the field is registered.
+"""
+from crunchbase.thumbnails import thumbnail_url
+
+FIELD_EXTRACTORS = {}
+
+
+def path_extractor(name):
+    keys = ['data'] + [int(k) if k.isdigit() else k for k in name.split('__')]
+
+    def extract(detail):
+        value = detail
+        for key in keys:
+            try:
+                value = value[key]
+            except (KeyError, IndexError, TypeError):
+                return None
+        return value
+    return extract
+
+
+def register_field(name, extractor=None):
+    """
+    :param name: the key the value will be available with in the list items
+    :param extractor: callable taking the projected detail; if missing, the value is read from the path in the name
+    """
+    FIELD_EXTRACTORS[name] = extractor or path_extractor(name)
+
+
+def get_primary_image(detail, size='row'):
+    # Helper to deal with missing images; the image is served through the local thumbnails, rather than from the CDN
+    try:
+        image_path = detail['data']['relationships']['primary_image']['items'][0]['path']
+    except (KeyError, IndexError):
+        return None
+    return thumbnail_url(image_path, size)
+
+
+def project_fields(detail, fields=None):
+    """
+    :param detail: projected detail of an item
+    :param fields: names of the fields to extract, all the registered ones by default
+    :return: :rtype: dict
+    :raise KeyError: if a field is not registered
+    """
+    if fields is None:
+        fields = FIELD_EXTRACTORS
+    return dict((field, FIELD_EXTRACTORS[field](detail)) for field in fields)
+
+
+register_field('properties__name')
+register_field('properties__short_description')
+register_field('properties__description')
+# In this case, I'm gonna use a shorthand, since the actual key would be unwieldy
+register_field('primary_image', get_primary_image)
@@ -0,0 +1,43 @@
+from optparse import make_option
+import json
+from django.core.management.base import BaseCommand, CommandError
+from crunchbase.benchmarks import micro
+from crunchbase.benchmarks.stub_server import StubCrunchbaseServer, stub_upstream
+
+
+class Command(BaseCommand):
+    help = "Runs the microbenchmarks against a local stub of the Crunchbase API and writes the results as JSON"
+    option_list = BaseCommand.option_list + (
+        make_option('--repeat', type='int', dest='repeat', default=20,
+                    help='Number of timed calls of each benchmark'),
+        make_option('--latency', type='float', dest='latency', default=0.05,
+                    help='Seconds the stub server waits before each response'),
+        make_option('--benchmark', action='append', dest='only',
+                    help='Benchmark to run (can be repeated, defaults to all of them)'),
+        make_option('--output', dest='output', default=None,
+                    help='File to write the results to, instead of the standard output'),
+        make_option('--compare', dest='baseline', default=None,
+                    help='Results of a previous run; fails if any benchmark got slower than the tolerance'),
+        make_option('--tolerance', type='float', dest='tolerance', default=0.2,
+                    help='Fraction by which the median of a benchmark can exceed the baseline'),
+    )
+
+    def handle(self, *args, **options):
+        server = StubCrunchbaseServer(latency=options['latency']).start()
+        try:
+            with stub_upstream(server):
+                results = micro.run(server, options['repeat'], options['only'])
+        finally:
+            server.stop()
+        output = json.dumps(results, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+        else:
+            self.stdout.write(output)
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                regressions = micro.compare(results, json.load(f), options['tolerance'])
+            if regressions:
+                raise CommandError("Slower than the baseline:\n" + "\n".join(
+                    "%s: %.2fms -> %.2fms" % regression for regression in regressions))
@@ -0,0 +1,56 @@
+from optparse import make_option
+import json
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from crunchbase.benchmarks import load
+from crunchbase.benchmarks.stub_server import StubCrunchbaseServer, stub_upstream
+
+
+class Command(BaseCommand):
+    help = "Puts the search, home and detail views under load, served by waitress with a local stub of the Crunchbase " \
+           "API, and reports throughput, latency percentiles, upstream calls per request and cache hit ratio as JSON"
+    option_list = BaseCommand.option_list + (
+        make_option('--concurrency', type='int', dest='concurrency', default=10,
+                    help='Number of concurrent clients'),
+        make_option('--duration', type='int', dest='duration', default=30,
+                    help='Seconds to run for'),
+        make_option('--threads', type='int', dest='threads', default=4,
+                    help='Number of waitress worker threads'),
+        make_option('--latency', type='float', dest='latency', default=0.05,
+                    help='Seconds the stub server waits before each response'),
+        make_option('--mix', dest='mix', default=None,
+                    help='Weights of the kinds of request, eg. home=1,list=3,search=3,detail=3'),
+        make_option('--url', dest='url', default=None,
+                    help='Put an already running app under load instead (upstream and cache figures are not available)'),
+        make_option('--output', dest='output', default=None,
+                    help='File to write the results to, instead of the standard output'),
+    )
+
+    def parse_mix(self, mix):
+        try:
+            weights = dict((kind, float(weight)) for kind, weight in (pair.split('=') for pair in mix.split(',')))
+        except ValueError:
+            raise CommandError("Invalid mix: %s" % mix)
+        if not set(weights) <= set(load.DEFAULT_MIX):
+            raise CommandError("Unknown kinds of request: %s" % ', '.join(set(weights) - set(load.DEFAULT_MIX)))
+        return weights
+
+    def handle(self, *args, **options):
+        mix = self.parse_mix(options['mix']) if options['mix'] else None
+        if options['url']:
+            generator = load.LoadGenerator(options['url'].rstrip('/'), options['concurrency'], options['duration'], mix)
+            results = load.summarize(generator.results, generator.run())
+        else:
+            server = StubCrunchbaseServer(latency=options['latency']).start()
+            try:
+                with stub_upstream(server):
+                    results = load.run_in_process(get_wsgi_application(), server, options['concurrency'],
+                                                  options['duration'], options['threads'], mix)
+            finally:
+                server.stop()
+        output = json.dumps(results, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+        else:
+            self.stdout.write(output)
@@ -0,0 +1,54 @@
+from functools import partial
+from optparse import make_option
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from crunchbase import upstream
+from crunchbase.models import MIRROR_MODELS
+from crunchbase.views import CrunchbaseQuery, CrunchbaseEndpoint, fetch_concurrently, fetch_list_page, \
+    fetch_projected, project_detail
+
+
+class Command(BaseCommand):
+    help = "Copies the Crunchbase lists and details into the database, so that they can be served with " \
+           "CRUNCHBASE_USE_MIRROR"
+    option_list = BaseCommand.option_list + (
+        make_option('--subset', action='append', dest='subsets', choices=sorted(CrunchbaseQuery.ENDPOINTS),
+                    help='Subset to mirror (can be repeated, defaults to all of them)'),
+        make_option('--pages', type='int', dest='pages', default=None,
+                    help='Max number of upstream pages to mirror for each subset'),
+    )
+    batch_size = 500  # Keeps the queries below SQLite's limit of 999 variables
+
+    def handle(self, *args, **options):
+        for subset in options['subsets'] or sorted(CrunchbaseQuery.ENDPOINTS):
+            with upstream.priority(upstream.WARMING):
+                self.mirror_subset(subset, options['pages'])
+
+    def mirror_subset(self, subset, max_pages=None):
+        uri = CrunchbaseQuery.ENDPOINTS[subset]
+        model = MIRROR_MODELS[uri]
+        page, number_of_pages = 1, 1
+        # Pages are processed one at a time, so that memory usage doesn't depend on the size of the subset
+        while page <= number_of_pages and (max_pages is None or page <= max_pages):
+            page_json = fetch_list_page(CrunchbaseEndpoint.BASE_URI + uri, {'page': page})
+            if page_json['data'].get('error'):
+                raise CommandError("Crunchbase returned an error for %s page %s: %s" % (subset, page,
+                                                                                       page_json['data']['error']))
+            paging = page_json['data']['paging']
+            number_of_pages = paging['number_of_pages']
+            items = page_json['data']['items']
+            details = fetch_concurrently([partial(upstream.run_with_priority, upstream.WARMING, fetch_projected,
+                                                  CrunchbaseEndpoint.BASE_URI + item['path'], project_detail)
+                                          for item in items])
+            position = (page - 1) * paging['items_per_page']
+            self.store(model, [model.from_detail(position + i, item, detail)
+                               for i, (item, detail) in enumerate(zip(items, details))])
+            self.stdout.write("%s: page %s of %s" % (subset, page, number_of_pages))
+            page += 1
+
+    def store(self, model, objects):
+        with transaction.atomic():
+            for i in range(0, len(objects), self.batch_size):
+                batch = objects[i:i + self.batch_size]
+                model.objects.filter(path__in=[o.path for o in batch]).delete()
+                model.objects.bulk_create(batch)
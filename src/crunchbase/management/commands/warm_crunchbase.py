@@ -0,0 +1,27 @@
+from optparse import make_option
+import time
+from django.core.management.base import BaseCommand
+from crunchbase.warming import warm
+
+
+class Command(BaseCommand):
+    help = "Refreshes the cached Crunchbase pages, home page details and popular searches before they expire"
+    option_list = BaseCommand.option_list + (
+        make_option('--pages', type='int', dest='pages', default=None,
+                    help='Number of upstream pages to warm for each subset'),
+        make_option('--queries', type='int', dest='queries', default=None,
+                    help='Number of the most frequent recent searches to warm'),
+        make_option('--no-details', action='store_false', dest='home_details', default=None,
+                    help="Don't warm the details of the items in the home page"),
+        make_option('--interval', type='int', dest='interval', default=None,
+                    help='Keep running, warming every INTERVAL seconds'),
+    )
+
+    def handle(self, *args, **options):
+        while True:
+            start = time.time()
+            warm(pages=options['pages'], home_details=options['home_details'], queries=options['queries'])
+            self.stdout.write("Cache warmed in %.1fs" % (time.time() - start))
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
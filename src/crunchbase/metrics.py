@@ -0,0 +1,129 @@
+"""
+Process-wide counters of what the requests cost: upstream calls, cache lookups, JSON decoding and template rendering,
+in total and split by view.
+
+The time spent in each part is also added to the timings of the request being served by the current thread, which the
+MetricsMiddleware reports; work handed over to the fetch pool is attributed to the request through bind().
+"""
+from contextlib import contextmanager
+import threading
+import time
+
+PARTS = ('upstream', 'cache', 'json', 'render')
+# Upper bounds, in seconds, of the buckets of the request duration histogram
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, float('inf'))
+
+_local = threading.local()
+
+
+class Registry(object):
+    def __init__(self):
+        self._values = {}  # (name, sorted label pairs): value
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def get(self, name, **labels):
+        return self._values.get((name, tuple(sorted(labels.items()))), 0)
+
+    def observe(self, name, seconds, **labels):
+        # Cumulative histogram, as Prometheus expects it
+        for bound in BUCKETS:
+            if seconds <= bound:
+                self.inc(name + '_bucket', le='+Inf' if bound == float('inf') else str(bound), **labels)
+        self.inc(name + '_count', **labels)
+        self.inc(name + '_sum', seconds, **labels)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def render(self):
+        """
+        :return: :rtype: str the values in the Prometheus text format
+        """
+        lines = []
+        with self._lock:
+            values = sorted(self._values.items())
+        for (name, labels), value in values:
+            label_text = ','.join('%s="%s"' % (k, str(v).replace('"', '\\"')) for k, v in labels)
+            lines.append('%s%s %s' % (name, '{%s}' % label_text if label_text else '', repr(float(value))))
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+class RequestTimings(object):
+    """
+    Seconds spent in each part while serving a request; the parts that run concurrently in the fetch pool are summed, so
+    they can add up to more than the duration of the request.
+    """
+    def __init__(self):
+        self.start = time.time()
+        self.parts = dict.fromkeys(PARTS, 0.0)
+        self.calls = dict.fromkeys(PARTS, 0)
+        self._lock = threading.Lock()
+
+    def add(self, part, seconds):
+        with self._lock:
+            self.parts[part] += seconds
+            self.calls[part] += 1
+
+    @property
+    def duration(self):
+        return time.time() - self.start
+
+
+def start_request():
+    _local.timings = RequestTimings()
+    return _local.timings
+
+
+def end_request():
+    timings, _local.timings = getattr(_local, 'timings', None), None
+    return timings
+
+
+def current():
+    """
+    :return: :rtype: RequestTimings of the request served by the current thread, if any
+    """
+    return getattr(_local, 'timings', None)
+
+
+def bind(func):
+    """
+    Wraps a callable that will run in another thread, so that its timings are added to the current request's
+    """
+    timings = current()
+    if timings is None:
+        return func
+
+    def bound(*args, **kwargs):
+        previous, _local.timings = current(), timings
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _local.timings = previous
+    return bound
+
+
+@contextmanager
+def timed(part):
+    """
+    Adds the time spent in the block to the totals of the part, and to the timings of the current request
+    """
+    start = time.time()
+    try:
+        yield
+    finally:
+        elapsed = time.time() - start
+        registry.inc('crunchbase_%s_calls_total' % part)
+        registry.inc('crunchbase_%s_seconds_total' % part, elapsed)
+        timings = current()
+        if timings is not None:
+            timings.add(part, elapsed)
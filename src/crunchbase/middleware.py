@@ -0,0 +1,87 @@
+import logging
+import time
+from django.conf import settings
+from django.template.response import TemplateResponse
+from crunchbase import metrics, upstream
+
+logger = logging.getLogger(__name__)
+
+
+class MetricsMiddleware(object):
+    """
+    Records the duration of each request by view, split into the time spent upstream, in the cache, decoding JSON and
+    rendering the templates; with CRUNCHBASE_SERVER_TIMING the split is also sent back in a Server-Timing header, and
+    requests slower than CRUNCHBASE_SLOW_REQUEST_SECONDS are logged.
+
+    It should come right after UpstreamUnavailableMiddleware in MIDDLEWARE_CLASSES, so that it sees the whole request,
+    including the rendering of the template responses.
+    """
+    def process_request(self, request):
+        request._metrics = metrics.start_request()
+
+    def process_template_response(self, request, response):
+        timings = getattr(request, '_metrics', None)
+        if timings is None:
+            return response
+        # The templates can trigger upstream calls (eg. for the detail fields of the items), which are not counted twice
+        start, others = time.time(), sum(timings.parts.values())
+
+        def rendered(response):
+            elapsed = time.time() - start
+            timings.add('render', max(elapsed - (sum(timings.parts.values()) - others), 0))
+            metrics.registry.inc('crunchbase_render_calls_total')
+            metrics.registry.inc('crunchbase_render_seconds_total', elapsed)
+        response.add_post_render_callback(rendered)
+        return response
+
+    def process_response(self, request, response):
+        timings = getattr(request, '_metrics', None)
+        if timings is None:  # Another middleware answered before us
+            return response
+        metrics.end_request()
+        duration = timings.duration
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unresolved'
+        metrics.registry.inc('crunchbase_view_requests_total', view=view, status=response.status_code)
+        metrics.registry.observe('crunchbase_view_seconds', duration, view=view)
+        for part, seconds in timings.parts.items():
+            metrics.registry.inc('crunchbase_view_part_seconds_total', seconds, view=view, part=part)
+        metrics.registry.inc('crunchbase_view_upstream_calls_total', timings.calls['upstream'], view=view)
+        if getattr(settings, 'CRUNCHBASE_SERVER_TIMING', False):
+            response['Server-Timing'] = ', '.join(
+                ['%s;dur=%.1f' % (part, timings.parts[part] * 1000) for part in metrics.PARTS] +
+                ['total;dur=%.1f' % (duration * 1000)])
+        slow = getattr(settings, 'CRUNCHBASE_SLOW_REQUEST_SECONDS', None)
+        if slow is not None and duration > slow:
+            logger.warning("Slow request %s (%s): %.0fms, %s upstream calls, %s", request.get_full_path(), view,
+                           duration * 1000, timings.calls['upstream'],
+                           ', '.join('%s %.0fms' % (part, timings.parts[part] * 1000) for part in metrics.PARTS))
+        return response
+
+
+class UpstreamUnavailableMiddleware(object):
+    """
+    Answers 503, with a Retry-After header, to the requests that could not get an upstream request slot in time, rather
+    than failing with a 500. The views fetch what the templates render, but the template responses are rendered here, so
+    that an upstream call made by a template is answered in the same way.
+
+    It should come first in MIDDLEWARE_CLASSES, before MetricsMiddleware, so that the other middlewares see the template
+    responses before they are rendered.
+    """
+    template_name = 'crunchbase/unavailable.html'
+
+    def unavailable(self, request):
+        response = TemplateResponse(request, self.template_name, status=503)
+        response['Retry-After'] = upstream.get_limiter().retry_after()
+        return response
+
+    def process_exception(self, request, exception):
+        if isinstance(exception, upstream.RateLimitExceeded):
+            return self.unavailable(request)
+
+    def process_template_response(self, request, response):
+        try:
+            response.render()
+        except upstream.RateLimitExceeded:
+            return self.unavailable(request)
+        return response
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+MIRROR_TABLES = ('crunchbase_organization', 'crunchbase_product')
+
+
+def create_fts_tables(apps, schema_editor):
+    # External content FTS tables, kept in sync by triggers as in the SQLite docs
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table in MIRROR_TABLES:
+        schema_editor.execute('CREATE VIRTUAL TABLE %s_fts USING fts4(content="%s", name, description)' % (table, table))
+        schema_editor.execute('CREATE TRIGGER %s_bu BEFORE UPDATE ON %s BEGIN '
+                              'DELETE FROM %s_fts WHERE docid=old.rowid; END' % (table, table, table))
+        schema_editor.execute('CREATE TRIGGER %s_bd BEFORE DELETE ON %s BEGIN '
+                              'DELETE FROM %s_fts WHERE docid=old.rowid; END' % (table, table, table))
+        schema_editor.execute('CREATE TRIGGER %s_au AFTER UPDATE ON %s BEGIN '
+                              'INSERT INTO %s_fts(docid, name, description) VALUES(new.rowid, new.name, new.description); '
+                              'END' % (table, table, table))
+        schema_editor.execute('CREATE TRIGGER %s_ai AFTER INSERT ON %s BEGIN '
+                              'INSERT INTO %s_fts(docid, name, description) VALUES(new.rowid, new.name, new.description); '
+                              'END' % (table, table, table))
+
+
+def drop_fts_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table in MIRROR_TABLES:
+        for trigger in ('bu', 'bd', 'au', 'ai'):
+            schema_editor.execute('DROP TRIGGER IF EXISTS %s_%s' % (table, trigger))
+        schema_editor.execute('DROP TABLE IF EXISTS %s_fts' % table)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Organization',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('path', models.CharField(unique=True, max_length=255)),
+                ('position', models.PositiveIntegerField(db_index=True)),
+                ('name', models.CharField(max_length=255)),
+                ('type', models.CharField(max_length=50)),
+                ('short_description', models.TextField(blank=True)),
+                ('description', models.TextField(blank=True)),
+                ('primary_image', models.CharField(max_length=500, blank=True)),
+                ('detail', models.TextField()),
+            ],
+            options={
+                'ordering': ('position',),
+                'abstract': False,
+            },
+            bases=(models.Model,),
+        ),
+        migrations.CreateModel(
+            name='Product',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('path', models.CharField(unique=True, max_length=255)),
+                ('position', models.PositiveIntegerField(db_index=True)),
+                ('name', models.CharField(max_length=255)),
+                ('type', models.CharField(max_length=50)),
+                ('short_description', models.TextField(blank=True)),
+                ('description', models.TextField(blank=True)),
+                ('primary_image', models.CharField(max_length=500, blank=True)),
+                ('detail', models.TextField()),
+            ],
+            options={
+                'ordering': ('position',),
+                'abstract': False,
+            },
+            bases=(models.Model,),
+        ),
+        migrations.RunPython(create_fts_tables, drop_fts_tables),
+    ]
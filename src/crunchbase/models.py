@@ -1,3 +1,90 @@
-from django.db import models
+from django.db import connection, models
+from crunchbase.fields import get_primary_image
+from crunchbase.search_index import tokenize
+import json
 
-# Create your models here.
+
+class MirroredItemManager(models.Manager):
+    def search(self, term):
+        """
+        Full-text search on name and description, with the words of the term used as prefixes; SQLite uses the FTS
+        table created by the migrations, the other backends fall back to LIKE on the name.
+
+        :param term: free text
+        :return: :rtype: QuerySet
+        """
+        tokens = tokenize(term)
+        if not tokens:
+            return self.none()
+        if connection.vendor == 'sqlite':
+            table = self.model._meta.db_table
+            return self.extra(where=['%s.id IN (SELECT docid FROM %s_fts WHERE %s_fts MATCH %%s)' % (table, table, table)],
+                              params=[' '.join('%s*' % t for t in tokens)])
+        queryset = self.all()
+        for token in tokens:
+            queryset = queryset.filter(name__icontains=token)
+        return queryset
+
+
+class MirroredItem(models.Model):
+    """
+    Local copy of a Crunchbase item, with the projected detail as served by the API views
+    """
+    path = models.CharField(max_length=255, unique=True)
+    position = models.PositiveIntegerField(db_index=True)  # Index in the upstream list, to keep the same order
+    name = models.CharField(max_length=255)
+    type = models.CharField(max_length=50)
+    short_description = models.TextField(blank=True)
+    description = models.TextField(blank=True)
+    primary_image = models.CharField(max_length=500, blank=True)  # Url of the local thumbnail
+    detail = models.TextField()  # JSON
+
+    objects = MirroredItemManager()
+
+    class Meta:
+        abstract = True
+        ordering = ('position',)
+
+    def __unicode__(self):
+        return self.name
+
+    def __getitem__(self, key):
+        # The views and templates use the list items as dicts
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    @property
+    def properties__short_description(self):
+        return self.short_description
+
+    def get_detail(self):
+        return json.loads(self.detail)
+
+    @classmethod
+    def from_detail(cls, position, item, detail):
+        """
+        :param position: index of the item in the upstream list
+        :param item: projected list item
+        :param detail: projected detail
+        :return: an unsaved instance
+        """
+        properties = detail['data']['properties']
+        return cls(path=item['path'], position=position, name=item.get('name') or '', type=item.get('type') or '',
+                   short_description=properties.get('short_description') or '',
+                   description=properties.get('description') or '',
+                   primary_image=get_primary_image(detail) or '',
+                   detail=json.dumps(detail))
+
+
+class Organization(MirroredItem):
+    pass
+
+
+class Product(MirroredItem):
+    pass
+
+
+# Keyed by the endpoint uris in CrunchbaseQuery.ENDPOINTS
+MIRROR_MODELS = {'organizations': Organization, 'products': Product}
@@ -0,0 +1,57 @@
+"""
+Counts of the recent searches, so that the most frequent ones can be kept warm in the cache.
+
+Each process counts its own searches and merges them into a shared cache entry every now and then; the counts are
+approximate, since concurrent merges can overwrite each other, but that's enough to find the popular queries.
+"""
+from collections import Counter
+import threading
+from crunchbase.tiered_cache import cache
+
+SHARED_KEY = 'crunchbase-recent-queries'
+
+
+def normalize_query(query):
+    """
+    Searches that only differ in case or spacing are the same one, both in the log and upstream
+    """
+    return ' '.join(query.lower().split())
+
+
+class QueryLog(object):
+    max_size = 1000  # Distinct queries kept in the shared entry, the least frequent are dropped beyond this
+    publish_every = 50
+
+    def __init__(self):
+        self._unpublished = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, subset, query):
+        key = (subset, normalize_query(query))
+        with self._lock:
+            self._unpublished[key] += 1
+            if sum(self._unpublished.values()) >= self.publish_every:
+                self.publish()
+
+    def publish(self):
+        """
+        Merges the searches counted since the last call into the shared entry; the read and the write are not atomic, so
+        the counts of another process merging at the same time can be lost
+        """
+        shared = Counter(cache.get(SHARED_KEY) or {})
+        shared.update(self._unpublished)
+        cache.set(SHARED_KEY, dict(shared.most_common(self.max_size)), None)
+        self._unpublished = Counter()
+
+    def most_common(self, n):
+        """
+        :param n: number of queries
+        :return: :rtype: list of ((subset, query), count), counting the searches of all the processes
+        """
+        with self._lock:
+            counts = Counter(cache.get(SHARED_KEY) or {})
+            counts.update(self._unpublished)
+        return counts.most_common(n)
+
+
+query_log = QueryLog()
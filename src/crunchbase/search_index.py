@@ -0,0 +1,104 @@
+"""
+In-process inverted index of the item names found in the upstream list pages.
+
+The Crunchbase API can't be queried for products, so their search is answered from here; the index is filled as the
+list pages get fetched, so it covers whatever has been seen so far by the process.
+"""
+import bisect
+import re
+import threading
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower()) if text else []
+
+
+class NameIndex(object):
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._items = {}  # path: (position, page, item)
+        self._postings = {}  # token: set of paths
+        self._tokens = []  # Sorted, for prefix lookups
+        self._pages = {}  # page: list of paths
+
+    def __len__(self):
+        return len(self._items)
+
+    def add_page(self, page, position, items):
+        """
+        Indexes (or re-indexes, if it changed) an upstream page
+
+        :param page: 1-based number of the upstream page
+        :param position: overall index of the first item of the page, used to sort the results as upstream does
+        :param items: list items, with at least path and name
+        """
+        paths = [item['path'] for item in items]
+        with self._lock:
+            if self._pages.get(page) == paths:
+                return
+            for path in self._pages.pop(page, []):
+                if path in self._items and self._items[path][1] == page:
+                    self._remove(path)
+            for offset, item in enumerate(items):
+                if item['path'] in self._items:
+                    self._remove(item['path'])
+                self._add(item, position + offset, page)
+            self._pages[page] = paths
+
+    def _add(self, item, position, page):
+        self._items[item['path']] = (position, page, item)
+        for token in set(tokenize(item.get('name'))):
+            if token not in self._postings:
+                self._postings[token] = set()
+                bisect.insort(self._tokens, token)
+            self._postings[token].add(item['path'])
+
+    def _remove(self, path):
+        position, page, item = self._items.pop(path)
+        for token in set(tokenize(item.get('name'))):
+            postings = self._postings[token]
+            postings.discard(path)
+            if not postings:
+                del self._postings[token]
+                del self._tokens[bisect.bisect_left(self._tokens, token)]
+
+    def search(self, term):
+        """
+        Finds the items whose name has words starting with each of the words of the term
+
+        :param term: free text
+        :return: :rtype: list of items, in upstream order
+        """
+        tokens = tokenize(term)
+        if not tokens:
+            return []
+        with self._lock:
+            matches = None
+            for token in tokens:
+                paths = set()
+                i = bisect.bisect_left(self._tokens, token)
+                while i < len(self._tokens) and self._tokens[i].startswith(token):
+                    paths.update(self._postings[self._tokens[i]])
+                    i += 1
+                matches = paths if matches is None else matches & paths
+                if not matches:
+                    return []
+            entries = sorted(self._items[path] for path in matches)
+        return [dict(item) for position, page, item in entries]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(uri):
+    """
+    :param uri: endpoint uri, without query
+    :return: :rtype: NameIndex
+    """
+    with _indexes_lock:
+        if uri not in _indexes:
+            _indexes[uri] = NameIndex()
+        return _indexes[uri]
@@ -0,0 +1,51 @@
+import hashlib
+from django import template
+from django.conf import settings
+from django.utils.encoding import force_text
+from crunchbase import views
+
+register = template.Library()
+
+
+class CachedFragmentNode(template.Node):
+    def __init__(self, nodelist, name, path, vary_on):
+        self.nodelist = nodelist
+        self.name = name
+        self.path = path
+        self.vary_on = vary_on
+
+    def render(self, context):
+        path = self.path.resolve(context)
+        version, stale = views.get_version(path) if path and not views.use_mirror() else (None, False)
+        if version is None:  # Not from the cache, so there's nothing to tell when it changes
+            return self.nodelist.render(context)
+        if stale:  # The entry is being refreshed, and the fragment of its current version would outlive it
+            return self.nodelist.render(context)
+        if context.get('degraded'):  # Eg. rows rendered without their details, which must not be kept for the others
+            return self.nodelist.render(context)
+        parts = [self.name.resolve(context), path, version] + [v.resolve(context) for v in self.vary_on]
+        key = 'fragment-%s' % hashlib.md5(u'|'.join(force_text(p) for p in parts).encode('utf-8')).hexdigest()
+        content = views.cache.get(key)
+        if content is None:
+            content = self.nodelist.render(context)
+            views.cache.set(key, content, getattr(settings, 'CRUNCHBASE_FRAGMENT_CACHE_TIMEOUT', 6 * 3600))
+        return content
+
+
+@register.tag
+def cached_fragment(parser, token):
+    """
+    Caches the rendered block until the cache entry of the item changes version, eg.
+
+        {% cached_fragment "row" obj.path subset_name %} ... {% endcached_fragment %}
+
+    The first argument names the fragment, the second is the path of the item, any other one is added to the key. Nothing
+    is cached while the context has degraded set.
+    """
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError("%r takes at least a name and an item path" % bits[0])
+    nodelist = parser.parse(('endcached_fragment',))
+    parser.delete_first_token()
+    return CachedFragmentNode(nodelist, parser.compile_filter(bits[1]), parser.compile_filter(bits[2]),
+                              [parser.compile_filter(bit) for bit in bits[3:]])
@@ -1,17 +1,57 @@
 from django.conf import settings
 from django.core import urlresolvers
 from django.core.cache import cache
+from django.core.paginator import EmptyPage, PageNotAnInteger
 from django.http import Http404
-from django.test import TestCase
+from django.template import Context, Template
+from django.test import RequestFactory, TestCase
+from django.test.utils import override_settings
+from django.views.generic import TemplateView
 from requests import Response
+import hashlib
+import json
+import multiprocessing
+import os
+import pickle
 import requests
-from unittest import skip
-from crunchbase.views import CrunchbaseQuery, CrunchbaseEndpoint, CrunchbaseQueryset
+import shutil
+import StringIO
+import tempfile
+import threading
+import time
+from unittest import skip, skipIf
+from crunchbase import metrics, upstream, warming
+from crunchbase.benchmarks import load, micro
+from crunchbase.benchmarks.stub_server import StubCrunchbaseServer, stub_upstream
+from crunchbase.models import Organization
+from crunchbase.fields import project_fields
+from crunchbase.search_index import NameIndex
+from crunchbase.query_log import QueryLog
+from crunchbase.thumbnails import get_thumbnail
+from crunchbase.tiered_cache import cache as tiered_cache, Compressed, TieredCache
+from crunchbase.views import CrunchbaseQuery, CrunchbaseEndpoint, CrunchbaseQueryset, CrunchbaseItem, fetch_details, \
+    CrunchbaseSearchView, \
+    project_detail, project_list_page, get_cached, set_cached, fetch_once, PageLRU, stream_list_page, ijson, \
+    get_detail_pool, CursorPaginator, PageCacheMixin
 from django_webtest import WebTest
 import mock
 
 
-class FrontendAccessTest(WebTest):
+class IsolatedCacheMixin(object):
+    """
+    Empties both tiers of the cache around each test, for the tests that read or write the keys the views use
+    """
+    def setUp(self):
+        super(IsolatedCacheMixin, self).setUp()
+        tiered_cache.clear()
+
+    def tearDown(self):
+        tiered_cache.clear()
+        super(IsolatedCacheMixin, self).tearDown()
+
+
+@override_settings(CRUNCHBASE_PAGE_CACHE=False)  # The assertions need the context, which cached pages don't have
+class FrontendAccessTest(IsolatedCacheMixin, WebTest):
     def test_a_user_can_search_crunchbase(self):
         response = self.app.get(urlresolvers.reverse('crunchbase:search'))
         self.assertEqual(response.status_code, 200)
@@ -238,6 +278,16 @@ class CBSampleDataMixin(object):
                    'total_items': 286559}}
     sample_list_json = {'metadata': {}, 'data': sample_list_data}
 
+    def fake_get(self, url, params=None, **kwargs):
+        """
+        Stands in for upstream.get: the list endpoints return the sample list, anything else the sample detail
+        """
+        response = mock.Mock(status_code=200, headers={}, content='')
+        is_list = url.rstrip('/').rsplit('/', 1)[-1] in CrunchbaseQuery.ENDPOINTS.values()
+        list_json = dict(self.sample_list_json, metadata=self.sample_detail_data['metadata'])
+        response.json.return_value = list_json if is_list else self.sample_detail_data
+        return response
+
 
 class EndpointTest(TestCase, CBSampleDataMixin):
     # The actual CrunchBase API does not seem to allow setting a page size, so we're gonna have to work around that
@@ -275,7 +325,7 @@ class EndpointTest(TestCase, CBSampleDataMixin):
     @skip("To avoid clearing the cache during the tests")
     def test_list_items_are_cached(self):
         actual_return = self.ep.list(raw=True)
-        with mock.patch('crunchbase.views.requests', autospec=True) as req:
+        with mock.patch('crunchbase.views.upstream', autospec=True) as req:
             cache.clear()
             req.get.return_value = actual_return
             self.ep.list()
@@ -298,7 +348,7 @@ class EndpointTest(TestCase, CBSampleDataMixin):
         # It should be "are cached", yes.
         path = self.sample_list_data['data']['items'][0]['path']
         actual_return = self.ep.detail(path, raw=True)
-        with mock.patch('crunchbase.views.requests', autospec=True) as req:
+        with mock.patch('crunchbase.views.upstream', autospec=True) as req:
             cache.delete(path)
             req.get.return_value = actual_return
             self.ep.detail(path)
@@ -321,9 +371,10 @@ class EndpointTest(TestCase, CBSampleDataMixin):
     def test_fetch_values_returns_correct_image_data(self):
         # Testing images with the live Crunchbase API proved basically useless, so I've decided to go with fixtures for this
         fetched_values = self.ep.fetch_item_values(self.sample_list_data['items'][0]['path'], ('primary_image', ))
+        # Images are served through the local thumbnails
         self.assertEqual(
-            self.sample_detail_data['metadata']['image_path_prefix'] +
-            self.sample_detail_data['data']['relationships']['primary_image']['items'][0]['path'],
+            urlresolvers.reverse('crunchbase:thumbnail', args=(
+                'row', self.sample_detail_data['data']['relationships']['primary_image']['items'][0]['path'])),
             fetched_values['primary_image'])
 
     def test_list_data_can_be_sliced(self):
@@ -336,6 +387,7 @@ class EndpointTest(TestCase, CBSampleDataMixin):
         # To make thing
 
 
+@override_settings(CRUNCHBASE_STREAM_LIST_PAGES=False)  # The responses are mocked through json()
 class CBQuerysetTest(TestCase, CBSampleDataMixin):
     @classmethod
     def setUpClass(cls):
@@ -360,7 +412,7 @@ class CBQuerysetTest(TestCase, CBSampleDataMixin):
 
     def test_data_is_fetched_from_cb_on_evaluate(self):
         # we're going with a lazy implementation - only when length or items are requested we're going to get stuff
-        with mock.patch('crunchbase.views.requests', autospec=True) as req:
+        with mock.patch('crunchbase.views.upstream', autospec=True) as req:
             # To avoid picklingerrors, we're going to mock the cache too
             with mock.patch('crunchbase.views.cache', cache=mock.Mock()) as c:
                 c.get = mock.Mock(return_value=None)
@@ -376,9 +428,10 @@ class CBQuerysetTest(TestCase, CBSampleDataMixin):
 
     def test_data_is_fetched_when_not_present_in_current_page(self):
         qs = CrunchbaseQueryset(dataset=self.sample_list_json, dataset_uri=self.dataset_uri)
-        with mock.patch('crunchbase.views.requests', autospec=True) as req:
+        with mock.patch('crunchbase.views.upstream', autospec=True) as req:
             with mock.patch('crunchbase.views.cache', cache=mock.Mock()) as c:
                 c.get = mock.Mock(return_value=None)
+                req.get.return_value.json.return_value = self.sample_list_json
                 self.assertEqual(req.get.call_count, 0)
                 len(qs)
                 self.assertEqual(req.get.call_count, 0)  # The dataset is already present so no need to call
@@ -386,12 +439,11 @@ class CBQuerysetTest(TestCase, CBSampleDataMixin):
                 self.assertEqual(req.get.call_count, 0)  # As above
                 # Now, we're going to try to fetch an item with an index greater than the available items, so
                 item = qs[1001]
-                req.get.assert_called_once_with(self.dataset_uri, params={'user_key': settings.CRUNCHBASE_USER_KEY,
-                                                                          'page': 2})
+                req.get.assert_called_once_with(self.dataset_uri, params={'page': 2})
 
     def test_items_from_following_pages_are_fetched_correctly(self):
         qs = CrunchbaseQueryset(dataset=self.sample_list_json, dataset_uri=self.dataset_uri)
-        with mock.patch('crunchbase.views.requests', autospec=True) as req:
+        with mock.patch('crunchbase.views.upstream', autospec=True) as req:
             resp = mock.Mock()
             resp.json.return_value = self.sample_list_json
             req.get.return_value = resp
@@ -404,7 +456,7 @@ class CBQuerysetTest(TestCase, CBSampleDataMixin):
 
     def test_dataset_is_cached(self):
         qs = CrunchbaseQueryset(dataset_uri=self.dataset_uri)
-        with mock.patch('crunchbase.views.requests', autospec=True) as req:
+        with mock.patch('crunchbase.views.upstream', autospec=True) as req:
             with mock.patch('crunchbase.views.cache', cache=mock.Mock()) as c:
                 c.get = mock.Mock(return_value=None)
                 c.set = mock.Mock(side_effect=lambda *args, **kwargs: cache.set(*args, **kwargs))
@@ -424,9 +476,19 @@ class CBQuerysetTest(TestCase, CBSampleDataMixin):
             item = qs[1005]
             self.assertEqual(req.get.call_count, 2)
 
+    def test_decoded_pages_are_reused(self):
+        qs = CrunchbaseQueryset(dataset=self.page1.json(), dataset_uri=self.dataset_uri)
+        page2 = self.page2.json()
+        with mock.patch.object(qs, 'get_dataset', return_value=page2) as get_dataset:
+            qs[1001]
+            qs[1]
+            qs[1002]
+            self.assertEqual(get_dataset.call_count, 1)
+        self.assertEqual(qs[1]['path'], self.page1.json()['data']['items'][1]['path'])
+
     def test_dataset_contains_paging_and_metadata_as_properties(self):
         qs = CrunchbaseQueryset(dataset_uri=self.dataset_uri)
-        with mock.patch('crunchbase.views.requests', autospec=True) as req:
+        with mock.patch('crunchbase.views.upstream', autospec=True) as req:
             with mock.patch('crunchbase.views.cache', cache=mock.Mock()) as c:
                 c.get = mock.Mock(return_value=None)
                 c.set = mock.Mock(side_effect=lambda *args, **kwargs: cache.set(*args, **kwargs))
@@ -445,14 +507,27 @@ class CBQuerysetTest(TestCase, CBSampleDataMixin):
                 return requests.get(self.dataset_uri, params={'user_key': settings.CRUNCHBASE_USER_KEY, 'page': kwargs['page']})
             return self.page1
         qs = CrunchbaseQueryset(dataset_uri=self.dataset_uri)
-        with mock.patch('crunchbase.views.requests', autospec=True) as req:
+        with mock.patch('crunchbase.views.upstream', autospec=True) as req:
             req.get = mock.Mock(side_effect=pick_page)
             self.assertEqual(len(qs[:50]), 50)
             self.assertEqual(len(qs[100:200]), 100)
             self.assertEqual(len(qs[1050:1100]), 50)  # second page
-            # I have decided that slicing across pages should not be permitted - I think I have a working solution but
-            # the test output doesn't smell good to me, so I'll just go with an exception instead
-            self.assertRaises(IndexError, lambda: len(qs[:2500]))
+            self.assertEqual(len(qs[990:1000]), 10)  # last items of the first page
+            # Slices can span several pages
+            self.assertEqual(len(qs[:2500]), 2500)
+            self.assertEqual(len(qs[995:1005:2]), 5)
+
+    def test_next_page_is_read_ahead_near_the_end_of_a_page(self):
+        qs = CrunchbaseQueryset(dataset=self.page1.json(), dataset_uri=self.dataset_uri)
+        with mock.patch('crunchbase.views.get_detail_pool') as pool:
+            with mock.patch('crunchbase.views.cache', cache=mock.Mock()) as c:
+                c.__contains__ = mock.Mock(return_value=False)
+                qs[10:20]
+                self.assertFalse(pool.return_value.apply_async.called)
+                qs[980:990]
+                pool.return_value.apply_async.assert_called_once_with(upstream.run_with_priority,
+                                                                      (upstream.PREFETCH, qs.get_dataset),
+                                                                      {'page': 2, 'dependency': False})
 
     def test_dataset_can_be_searched(self):
         qs = CrunchbaseQueryset(dataset_uri=self.dataset_uri)
@@ -469,3 +544,702 @@ class CBQuerysetTest(TestCase, CBSampleDataMixin):
         # We're gonna start by matching exactly the requirements we used for the original list() implementation
         detail = CrunchbaseEndpoint(CrunchbaseQuery.ENDPOINTS['companies']).detail(item['path'])
         self.assertEqual(detail['data']['properties']['short_description'], item['properties__short_description'])
+
+
+class CursorPaginatorTest(TestCase):
+    dataset_uri = CrunchbaseEndpoint.BASE_URI + 'organizations'
+
+    def get_page(self, page=1):
+        items = [{'path': 'organization/item-%s' % i, 'name': 'Item %s' % i, 'type': 'Organization'}
+                 for i in range((page - 1) * 1000, min(page * 1000, 2505))]
+        paging = {'current_page': page, 'items_per_page': 1000, 'number_of_pages': 3, 'total_items': 2505}
+        return {'metadata': {}, 'data': {'items': items, 'paging': paging}}
+
+    def test_only_the_upstream_page_of_the_items_is_fetched(self):
+        qs = CrunchbaseQueryset(dataset_uri=self.dataset_uri)
+        with mock.patch.object(qs, 'get_dataset', side_effect=self.get_page) as get_dataset:
+            paginator = CursorPaginator(qs, 10)
+            page = paginator.page(150)
+            get_dataset.assert_called_once_with(page=2)
+        self.assertEqual([i.path for i in page], ['organization/item-%s' % i for i in range(1490, 1500)])
+        self.assertEqual(paginator.count, 2505)  # From total_items, not items_per_page * number_of_pages
+        self.assertEqual(paginator.num_pages, 251)
+        self.assertEqual((page.previous_cursor, page.next_cursor, page.upstream_page), (1480, 1500, 2))
+        self.assertEqual((page.start_index(), page.end_index()), (1491, 1500))
+
+    def test_pages_can_start_anywhere(self):
+        qs = CrunchbaseQueryset(dataset_uri=self.dataset_uri)
+        with mock.patch.object(qs, 'get_dataset', side_effect=self.get_page):
+            paginator = CursorPaginator(qs, 10)
+            page = paginator.page_at(2497)
+            self.assertEqual(len(page), 8)
+            self.assertIsNone(page.next_cursor)
+            self.assertEqual(page.previous_cursor, 2487)
+            self.assertIsNone(paginator.page_at(0).previous_cursor)
+            self.assertRaises(EmptyPage, paginator.page, 252)
+            self.assertRaises(PageNotAnInteger, paginator.page_at, 'last')
+
+    def test_items_are_walked_reading_each_page_once(self):
+        qs = CrunchbaseQueryset(dataset_uri=self.dataset_uri)
+        with mock.patch('crunchbase.views.fetch_list_page', side_effect=lambda url, params: self.get_page(**params)) \
+                as fetch_list_page, \
+                mock.patch('crunchbase.views.set_cached') as set_cached, \
+                mock.patch('crunchbase.views.index_page') as index_page:
+            paths = [item['path'] for item in qs.iter_items(start=995, read_ahead=1)]
+            self.assertEqual(sorted(c[0][1]['page'] for c in fetch_list_page.call_args_list), [1, 2, 3])
+            # The pages of an export would evict the cache entries and grow the local index of the views
+            self.assertFalse(set_cached.called)
+            self.assertFalse(index_page.called)
+        self.assertEqual(paths, ['organization/item-%s' % i for i in range(995, 2505)])
+
+
+class FetchDetailsTest(IsolatedCacheMixin, TestCase, CBSampleDataMixin):
+    def test_only_missing_details_are_requested(self):
+        paths = [i['path'] for i in self.sample_list_data['items']] + ['organization/not-cached']
+        # The requests are made by the pool threads, whose calls the mocks could miscount
+        requested, stored = [], []
+
+        def get(url, params=None, **kwargs):
+            requested.append(url)
+            return self.fake_get(url, params, **kwargs)
+
+        with mock.patch('crunchbase.views.upstream.get', side_effect=get):
+            with mock.patch('crunchbase.views.cache', cache=mock.Mock()) as c:
+                cached = {'data': 'cached', 'refresh_at': time.time() + 60}
+                c.get = mock.Mock(side_effect=lambda key: cached if key == paths[0] else None)
+                c.set = lambda key, value, timeout=None: stored.append(key)
+                details = fetch_details(CrunchbaseEndpoint.BASE_URI, paths + paths)  # Duplicates should be ignored
+        self.assertItemsEqual(requested, [CrunchbaseEndpoint.BASE_URI + path for path in paths[1:]])
+        self.assertItemsEqual(stored, paths[1:])
+        self.assertItemsEqual(details.keys(), paths)
+        self.assertEqual(details[paths[0]], 'cached')
+
+    def test_cached_details_are_returned_past_the_deadline(self):
+        paths = [i['path'] for i in self.sample_list_data['items']] + ['organization/not-cached']
+        set_cached(paths[0], 'cached', 'detail')
+        with mock.patch('crunchbase.views.get_detail_pool') as pool:
+            pool.return_value.map_async.return_value.get.side_effect = multiprocessing.TimeoutError
+            self.assertEqual(fetch_details(CrunchbaseEndpoint.BASE_URI, paths, timeout=0), {paths[0]: 'cached'})
+
+    def test_list_fetches_all_the_details_of_a_page_at_once(self):
+        ep = CrunchbaseEndpoint(CrunchbaseQuery.ENDPOINTS['companies'])
+        with mock.patch('crunchbase.views.upstream.get', side_effect=self.fake_get), \
+                mock.patch('crunchbase.views.fetch_details', side_effect=fetch_details) as fd:
+            data = ep.list(per_page=5, fetch_values=('properties__short_description',))['data']
+            self.assertEqual(fd.call_count, 1)
+        self.assertTrue(all('properties__short_description' in item for item in data['items']))
+
+
+class UpstreamClientTest(TestCase):
+    def test_session_is_shared_between_calls(self):
+        self.assertIs(upstream.get_session(), upstream.get_session())
+
+    def test_get_adds_user_key_and_timeouts(self):
+        with mock.patch.object(upstream.get_session(), 'get') as session_get:
+            upstream.get(CrunchbaseEndpoint.BASE_URI + 'organizations', params={'page': 2})
+            args, kwargs = session_get.call_args
+            self.assertEqual(kwargs['params'], {'page': 2, 'user_key': settings.CRUNCHBASE_USER_KEY})
+            self.assertEqual(kwargs['timeout'], (settings.CRUNCHBASE_CONNECT_TIMEOUT, settings.CRUNCHBASE_READ_TIMEOUT))
+
+
+class ProjectionTest(TestCase, CBSampleDataMixin):
+    def test_list_pages_keep_only_the_rendered_fields(self):
+        projected = project_list_page(self.sample_list_json)
+        self.assertEqual(projected['data']['paging'], self.sample_list_data['paging'])
+        self.assertEqual(projected['data']['items'][0], {'path': 'organization/web-tools-weekly', 'name': 'Web Tools Weekly',
+                                                         'type': 'Organization'})
+
+    @skipIf(ijson is None, "ijson with yajl2 is not available")
+    def test_streamed_list_pages_are_projected_the_same_way(self):
+        stream = StringIO.StringIO(json.dumps(self.sample_list_json))
+        self.assertEqual(stream_list_page(stream), project_list_page(self.sample_list_json))
+        error_json = {'metadata': {}, 'data': {'error': {'code': 404, 'message': 'Not found'}}}
+        self.assertEqual(stream_list_page(StringIO.StringIO(json.dumps(error_json))), project_list_page(error_json))
+
+    def test_details_keep_only_the_rendered_properties_and_relationships(self):
+        projected = project_detail(self.sample_detail_data)
+        self.assertEqual(projected['metadata'], self.sample_detail_data['metadata'])
+        self.assertEqual(projected['data']['properties']['short_description'],
+                         self.sample_detail_data['data']['properties']['short_description'])
+        self.assertNotIn('total_funding_usd', projected['data']['properties'])
+        self.assertItemsEqual(projected['data']['relationships'].keys(), ['primary_image'])  # no team or news here
+        ep = CrunchbaseEndpoint(CrunchbaseQuery.ENDPOINTS['companies'])
+        self.assertEqual(ep.fetch_item_values('', ('primary_image',), projected),
+                         ep.fetch_item_values('', ('primary_image',), self.sample_detail_data))
+
+    def test_relationships_keep_only_what_is_displayed(self):
+        detail = json.loads(json.dumps(self.sample_detail_data))
+        detail['data']['relationships'].update({
+            'current_team': {'items': [{'title': 'CEO', 'first_name': 'Jo', 'last_name': 'Doe', 'path': 'person/jo-doe',
+                                        'created_at': 1411368793}] * 3},
+            'news': {'items': [{'author': 'A', 'url': 'http://example.com/', 'title': 'News', 'posted_on': '2014-09-22',
+                                'type': 'News'}] * 20},
+            'investors': {'items': [{'path': 'organization/fund'}] * 2000},
+        })
+        relationships = project_detail(detail)['data']['relationships']
+        self.assertItemsEqual(relationships.keys(), ['primary_image', 'current_team', 'news'])
+        self.assertEqual(len(relationships['current_team']['items']), 3)
+        self.assertEqual(relationships['current_team']['items'][0],
+                         {'title': 'CEO', 'first_name': 'Jo', 'last_name': 'Doe', 'path': 'person/jo-doe'})
+        self.assertEqual(len(relationships['news']['items']), 5)
+        self.assertNotIn('type', relationships['news']['items'][0])
+
+
+class StaleWhileRevalidateTest(TestCase):
+    def tearDown(self):
+        tiered_cache.delete('swr-test')
+
+    def test_stale_entries_are_served_and_refreshed_once(self):
+        with self.settings(CRUNCHBASE_CACHE_TIMEOUTS={'detail': (-1, 60)}):
+            set_cached('swr-test', 'old', 'detail')
+        self.assertEqual(get_cached('swr-test'), ('old', True))
+        with mock.patch('crunchbase.views.get_detail_pool') as pool:
+            data = fetch_details('', ['swr-test'])
+            fetch_details('', ['swr-test'])  # A refresh is already running, so no other should be scheduled
+        self.assertEqual(data['swr-test'], 'old')
+        self.assertEqual(pool.return_value.apply_async.call_count, 1)
+        cache.delete('refreshing-swr-test')
+
+
+class SingleFlightTest(TestCase):
+    def tearDown(self):
+        tiered_cache.delete_many(['single-flight-test', 'fetching-single-flight-test'])
+
+    def test_concurrent_misses_fetch_only_once(self):
+        calls = []
+        release = threading.Event()
+
+        def fetch():
+            calls.append(1)
+            release.wait(5)
+            return 'fetched'
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(fetch_once('single-flight-test', fetch, 'detail')))
+                   for i in range(5)]
+        for t in threads:
+            t.start()
+        time.sleep(0.1)
+        release.set()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['fetched'] * 5)
+        self.assertEqual(get_cached('single-flight-test'), ('fetched', False))
+
+    def test_other_processes_wait_for_the_cached_value(self):
+        cache.add('fetching-single-flight-test', True)  # As if another process was fetching
+        set_cached('single-flight-test', 'from another process', 'detail')
+        fetch = mock.Mock()
+        self.assertEqual(fetch_once('single-flight-test', fetch, 'detail'), 'from another process')
+        self.assertFalse(fetch.called)
+
+
+@override_settings(CRUNCHBASE_PAGE_CACHE=False)
+class HomeSearchTest(IsolatedCacheMixin, WebTest, CBSampleDataMixin):
+    def test_the_main_search_page_fetches_all_the_details_at_once(self):
+        with mock.patch('crunchbase.views.upstream.get', side_effect=self.fake_get), \
+                mock.patch('crunchbase.views.fetch_details', side_effect=fetch_details) as fd:
+            response = self.app.get(urlresolvers.reverse('crunchbase:search'))
+            self.assertEqual(fd.call_count, 1)
+            self.assertEqual(len(fd.call_args[0][1]), 4)  # The sample items of both subsets
+        self.assertEqual(len(response.context['products_search_results']), 2)
+        self.assertIn('properties__short_description', response.context['products_search_results'][0])
+
+
+@override_settings(CRUNCHBASE_PAGE_CACHE=False)
+class HomeDeadlineTest(IsolatedCacheMixin, WebTest, CBSampleDataMixin):
+    def test_items_are_shown_without_details_after_the_deadline(self):
+        with mock.patch('crunchbase.views.upstream.get', side_effect=self.fake_get), \
+                mock.patch('crunchbase.views.fetch_details', return_value={}):
+            response = self.app.get(urlresolvers.reverse('crunchbase:search'))
+        self.assertEqual(len(response.context['companies_search_results']), 2)
+        self.assertNotIn('properties__short_description', response.context['companies_search_results'][0])
+
+    def test_rows_without_details_are_not_cached(self):
+        # The details are in the cache, so the rows have a version, but they were read past the deadline
+        for item in self.sample_list_data['items']:
+            set_cached(item['path'], project_detail(self.sample_detail_data), 'detail')
+        with mock.patch('crunchbase.views.upstream.get', side_effect=self.fake_get):
+            with mock.patch('crunchbase.views.fetch_details', return_value={}):
+                self.assertNotIn('A weekly newsletter', self.app.get(urlresolvers.reverse('crunchbase:search')))
+            self.assertIn('A weekly newsletter', self.app.get(urlresolvers.reverse('crunchbase:search')))
+
+    def test_lists_past_the_deadline_are_unavailable(self):
+        with mock.patch('crunchbase.views.fetch_concurrently', side_effect=multiprocessing.TimeoutError):
+            response = self.app.get(urlresolvers.reverse('crunchbase:search'), status=503)
+        self.assertIn('Retry-After', response.headers)
+
+
+@override_settings(CRUNCHBASE_PAGE_CACHE=False)
+class UpstreamUnavailableTest(IsolatedCacheMixin, WebTest, CBSampleDataMixin):
+    def test_views_answer_503_when_no_upstream_slot_is_available(self):
+        with mock.patch('crunchbase.views.fetch_details', side_effect=upstream.RateLimitExceeded):
+            response = self.app.get(urlresolvers.reverse('crunchbase:detail', args=('organization/corpora',)),
+                                    status=503)
+        self.assertGreaterEqual(int(response.headers['Retry-After']), 1)
+
+    @override_settings(TEMPLATE_DEBUG=False)  # As in production, where the include of the results table swallows errors
+    def test_results_answer_503_too(self):
+        # The detail fields of the rows are fetched by the view, before rendering
+        with mock.patch('crunchbase.views.upstream.get', side_effect=self.fake_get), \
+                mock.patch('crunchbase.views.fetch_details', side_effect=upstream.RateLimitExceeded):
+            self.app.get(urlresolvers.reverse('crunchbase:search', args=('companies',)), status=503)
+
+
+class PageLRUTest(TestCase):
+    def test_least_recently_used_pages_are_evicted(self):
+        lru = PageLRU(max_bytes=1)
+        lru.set(1, {'items': []})
+        self.assertEqual(lru.get(1), {'items': []})
+        lru.set(2, {'items': []})  # Over the limit, but the last page is always kept
+        self.assertNotIn(1, lru)
+        self.assertEqual(len(lru), 1)
+        lru.max_bytes = lru.size * 3
+        lru.set(3, {'items': []})
+        lru.get(2)
+        lru.set(4, {'items': []})
+        self.assertItemsEqual(lru._pages.keys(), [2, 4, 3])
+        lru.set(5, {'items': []})
+        self.assertNotIn(3, lru)
+
+
+class NameIndexTest(IsolatedCacheMixin, TestCase, CBSampleDataMixin):
+    def setUp(self):
+        super(NameIndexTest, self).setUp()
+        self.index = NameIndex()
+        self.index.add_page(1, 0, self.sample_list_data['items'])
+
+    def test_names_can_be_searched_by_prefix(self):
+        self.assertEqual([i['path'] for i in self.index.search('web TOOL')], ['organization/web-tools-weekly'])
+        self.assertEqual([i['path'] for i in self.index.search('corp')], ['organization/corpora'])
+        self.assertEqual(self.index.search('tools corpora'), [])
+        self.assertEqual(self.index.search(''), [])
+
+    def test_pages_are_reindexed_when_they_change(self):
+        renamed = [dict(self.sample_list_data['items'][0], name='Renamed')]
+        self.index.add_page(1, 0, renamed)
+        self.assertEqual(self.index.search('web'), [])
+        self.assertEqual(len(self.index.search('renamed')), 1)
+        self.assertEqual(len(self.index), 1)
+
+    def test_products_are_searched_locally(self):
+        products = CrunchbaseQuery().products.datastore
+        with mock.patch('crunchbase.views.upstream.get', side_effect=self.fake_get):
+            item = products[0]
+        with mock.patch('crunchbase.views.upstream', autospec=True) as req:
+            results = products.search(item['name'])
+            self.assertIn(item['path'], [x['path'] for x in results])
+            self.assertFalse(req.get.called)
+
+
+class MirrorTest(WebTest, CBSampleDataMixin):
+    def setUp(self):
+        self.detail = project_detail(self.sample_detail_data)
+        items = project_list_page(self.sample_list_json)['data']['items']
+        for position, item in enumerate(items):
+            Organization.from_detail(position, item, self.detail).save()
+
+    def test_mirror_can_be_searched(self):
+        # Only the name has "tools", while the sample detail shared by both items has "weekly" in the description
+        self.assertEqual([o.path for o in Organization.objects.search('tool')], ['organization/web-tools-weekly'])
+        self.assertEqual(Organization.objects.search('weekl').count(), 2)
+        self.assertEqual(Organization.objects.search('tutorial').count(), 2)  # Only in the description
+        self.assertFalse(Organization.objects.search('nothing like this').exists())
+
+    def test_views_can_be_served_from_the_mirror(self):
+        with self.settings(CRUNCHBASE_USE_MIRROR=True):
+            with mock.patch('crunchbase.views.upstream', autospec=True) as req:
+                response = self.app.get(urlresolvers.reverse('crunchbase:search', args=('companies',)),
+                                        params={'query': 'corpora'})
+                self.assertEqual([o.path for o in response.context['object_list']], ['organization/corpora'])
+                response = response.click('Corpora')
+                self.assertEqual(response.context['object']['properties']['name'], 'Web Tools Weekly')
+                self.assertFalse(req.get.called)
+
+
+@override_settings(CRUNCHBASE_PAGE_CACHE=False)
+class MetricsTest(IsolatedCacheMixin, WebTest, CBSampleDataMixin):
+    def setUp(self):
+        super(MetricsTest, self).setUp()
+        metrics.registry.clear()
+
+    def fetch_sample(self, api_path_prefix, paths, timeout=None):
+        with metrics.timed('upstream'):
+            pass
+        return dict((path, project_detail(self.sample_detail_data)) for path in paths)
+
+    def test_requests_are_timed_by_view_and_part(self):
+        with mock.patch('crunchbase.views.fetch_details', side_effect=self.fetch_sample):
+            with self.settings(CRUNCHBASE_SERVER_TIMING=True):
+                response = self.app.get(urlresolvers.reverse('crunchbase:detail', args=('organization/corpora',)))
+        parts = dict(entry.split(';dur=') for entry in response.headers['Server-Timing'].split(', '))
+        self.assertEqual(sorted(parts), sorted(metrics.PARTS + ('total',)))
+        self.assertEqual(metrics.registry.get('crunchbase_view_upstream_calls_total', view='crunchbase:detail'), 1)
+        self.assertEqual(metrics.registry.get('crunchbase_view_seconds_count', view='crunchbase:detail'), 1)
+        response = self.app.get(urlresolvers.reverse('crunchbase:metrics'))
+        self.assertIn('crunchbase_view_requests_total{status="200",view="crunchbase:detail"} 1.0', response.text)
+        self.assertIn('crunchbase_rate_limiter_queue_depth 0.0', response.text)
+
+    def test_work_in_the_pool_is_attributed_to_the_request(self):
+        def fetch():
+            with metrics.timed('upstream'):
+                pass
+
+        timings = metrics.start_request()
+        try:
+            get_detail_pool().apply_async(metrics.bind(fetch)).get()
+        finally:
+            metrics.end_request()
+        self.assertEqual(timings.calls['upstream'], 1)
+        self.assertIsNone(metrics.current())
+
+    @override_settings(DEBUG=False, INTERNAL_IPS=())
+    def test_metrics_are_not_public(self):
+        self.app.get(urlresolvers.reverse('crunchbase:metrics'), status=404)
+
+
+class PageCacheTest(WebTest, CBSampleDataMixin):
+    path = 'organization/page-cache-test'
+
+    def setUp(self):
+        self.url = urlresolvers.reverse('crunchbase:detail', args=(self.path,))
+
+    def tearDown(self):
+        tiered_cache.delete_many([self.path, 'page-%s' % hashlib.md5('detail|' + self.path).hexdigest()])
+
+    def fetch_sample(self, api_path_prefix, paths, timeout=None):
+        for path in paths:
+            if get_cached(path)[0] is None:
+                set_cached(path, project_detail(self.sample_detail_data), 'detail')
+        return dict((path, get_cached(path)[0]) for path in paths)
+
+    def test_pages_are_served_until_their_data_is_refreshed(self):
+        with mock.patch('crunchbase.views.fetch_details', side_effect=self.fetch_sample) as fd:
+            response = self.app.get(self.url)
+            self.assertEqual(fd.call_count, 1)
+            cached = self.app.get(self.url)
+            self.assertEqual(fd.call_count, 1)  # Neither the context nor the template were needed
+            self.assertEqual(cached.body, response.body)
+            self.assertEqual(cached.headers['ETag'], response.headers['ETag'])
+            self.app.get(self.url, headers={'If-None-Match': response.headers['ETag']}, status=304)
+            self.assertEqual(fd.call_count, 1)
+            set_cached(self.path, project_detail(self.sample_detail_data), 'detail')  # As a refresh would do
+            # Rendered again, but still a 304 since the data didn't actually change
+            self.app.get(self.url, headers={'If-None-Match': response.headers['ETag']}, status=304)
+            self.assertEqual(fd.call_count, 2)
+
+    def test_read_ahead_pages_are_not_dependencies(self):
+        qs = CrunchbaseQueryset(dataset_uri=CrunchbaseEndpoint.BASE_URI + 'organizations')
+        with mock.patch('crunchbase.views.cached_get', return_value=project_list_page(self.sample_list_json)):
+            qs.get_dataset(page=2, dependency=False)
+            qs.get_dataset(page=1)
+        self.assertEqual(qs.cache_dependencies(), [qs.dataset_cache_key(1)])
+
+    def test_searches_are_cached_with_their_raw_query(self):
+        # The links of the page have the query as it was typed
+        keys = []
+        for query in ('Cloud', 'cloud'):
+            view = CrunchbaseSearchView(subset_name='companies')
+            view.request = RequestFactory().get('/', {'query': query})
+            keys.append(view.page_cache_key())
+        self.assertNotEqual(keys[0], keys[1])
+
+    def test_views_are_not_cached_by_default(self):
+        view = type('PlainView', (PageCacheMixin, TemplateView), {'template_name': 'crunchbase/unavailable.html'})
+        with mock.patch('crunchbase.views.cache') as c:
+            response = view.as_view()(RequestFactory().get('/'))
+            response.render()
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(c.get.called)
+        self.assertFalse(c.set.called)
+
+    def test_stale_pages_are_rendered_again(self):
+        with mock.patch('crunchbase.views.fetch_details', side_effect=self.fetch_sample) as fd:
+            self.app.get(self.url)
+            with self.settings(CRUNCHBASE_CACHE_TIMEOUTS={'detail': (-1, 60)}):
+                set_cached(self.path, project_detail(self.sample_detail_data), 'detail')
+                self.app.get(self.url)
+                self.app.get(self.url)
+            self.assertEqual(fd.call_count, 3)
+
+
+class FragmentCacheTest(TestCase):
+    path = 'organization/fragment-cache-test'
+    template = Template('{% load crunchbase_tags %}{% cached_fragment "row" path subset %}{{ obj.name }}'
+                        '{% endcached_fragment %}')
+
+    def tearDown(self):
+        tiered_cache.delete(self.path)
+
+    def render(self, name, subset='companies'):
+        return self.template.render(Context({'path': self.path, 'subset': subset, 'obj': {'name': name}}))
+
+    def test_fragments_are_kept_until_the_data_changes(self):
+        self.assertEqual(self.render('Not cached yet'), 'Not cached yet')  # No version to key it with
+        set_cached(self.path, {}, 'detail')
+        self.assertEqual(self.render('First'), 'First')
+        self.assertEqual(self.render('Second'), 'First')
+        self.assertEqual(self.render('Second', subset='products'), 'Second')
+        set_cached(self.path, {}, 'detail')
+        self.assertEqual(self.render('Third'), 'Third')
+
+    def test_stale_entries_are_rendered_without_their_fragment(self):
+        set_cached(self.path, {}, 'detail')
+        self.assertEqual(self.render('First'), 'First')
+        with self.settings(CRUNCHBASE_CACHE_TIMEOUTS={'detail': (-1, 3600)}):
+            set_cached(self.path, {}, 'detail')
+        self.assertEqual(self.render('Second'), 'Second')
+        self.assertEqual(self.render('Third'), 'Third')  # Nor cached until the entry is refreshed
+
+
+class ThumbnailTest(WebTest):
+    image_path = 'image/upload/v1411368785/k6fnzdjqhambbqsaxp2y.jpg'
+
+    def setUp(self):
+        self.thumbnail_dir = tempfile.mkdtemp()
+        self.settings_override = self.settings(CRUNCHBASE_THUMBNAIL_DIR=self.thumbnail_dir)
+        self.settings_override.enable()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.thumbnail_dir)
+
+    def test_images_are_downloaded_once_and_cached_by_browsers(self):
+        url = urlresolvers.reverse('crunchbase:thumbnail', args=('row', self.image_path))
+        with mock.patch('crunchbase.thumbnails.upstream.get_session') as session:
+            session.return_value.get.return_value.content = b'not really a jpeg'
+            response = self.app.get(url)
+            self.assertEqual(response.body, b'not really a jpeg')  # PIL can't resize it, so it's served as it is
+            self.assertEqual(response.content_type, 'image/jpeg')
+            self.assertIn('max-age=31536000', response.headers['Cache-Control'])
+            self.assertEqual(self.app.get(url).body, b'not really a jpeg')
+            self.assertEqual(session.return_value.get.call_count, 1)
+            self.app.get(url, headers={'If-None-Match': response.headers['ETag']}, status=304)
+
+    def test_only_configured_sizes_and_relative_paths_are_served(self):
+        with mock.patch('crunchbase.thumbnails.upstream.get_session') as session:
+            self.app.get(urlresolvers.reverse('crunchbase:thumbnail', args=('huge', self.image_path)), status=404)
+            self.app.get(urlresolvers.reverse('crunchbase:thumbnail', args=('row', '../../etc/passwd')), status=404)
+            self.app.get(urlresolvers.reverse('crunchbase:thumbnail', args=('row', 'anything/else.jpg')), status=404)
+            self.app.get(urlresolvers.reverse('crunchbase:thumbnail', args=('row', u'image/upload/v1/caf\xe9.jpg')),
+                         status=404)
+            self.assertFalse(session.called)
+
+    def test_the_oldest_thumbnails_are_removed(self):
+        with mock.patch('crunchbase.thumbnails.upstream.get_session') as session, \
+                self.settings(CRUNCHBASE_THUMBNAIL_MAX_FILES=3):
+            session.return_value.get.return_value.content = b'not really a jpeg'
+            paths = [get_thumbnail('image/upload/v1/image-%s.jpg' % i, 'row')[0] for i in range(4)]
+        self.assertTrue(os.path.exists(paths[-1]))
+        self.assertEqual(sum(len(names) for root, dirs, names in os.walk(self.thumbnail_dir)), 2)
+
+
+class FieldProjectionTest(TestCase, CBSampleDataMixin):
+    def test_fields_are_read_from_their_path(self):
+        values = project_fields(self.sample_detail_data, ('properties__name', 'primary_image'))
+        self.assertEqual(values, {
+            'properties__name': 'Web Tools Weekly',
+            'primary_image': '/thumbnail/row/image/upload/v1411368785/k6fnzdjqhambbqsaxp2y.jpg'})
+        self.assertIsNone(project_fields({'data': {}}, ('properties__name',))['properties__name'])
+        self.assertRaises(KeyError, lambda: project_fields(self.sample_detail_data, ('properties__unknown',)))
+
+    def test_proxy_objects_fetch_their_fields_once(self):
+        qs = mock.Mock()
+        qs.fetch_values.return_value = project_fields(self.sample_detail_data)
+        item = CrunchbaseItem(self.sample_list_data['items'][0], qs)
+        self.assertNotIn('primary_image', item)
+        self.assertTrue(item['properties__short_description'])
+        self.assertTrue(item['primary_image'])
+        self.assertEqual(qs.fetch_values.call_count, 1)
+        self.assertRaises(KeyError, lambda: item['not_a_field'])
+        self.assertIsNone(item.get('not_a_field'))
+
+    def test_items_compare_as_the_upstream_dicts(self):
+        data = self.sample_list_data['items'][0]
+        item = CrunchbaseItem(data)
+        self.assertEqual(item, data)
+        self.assertIn(data, [item])
+        self.assertNotEqual(item, self.sample_list_data['items'][1])
+        self.assertFalse(hasattr(item, '__dict__'))
+
+
+class TieredCacheTest(TestCase):
+    def setUp(self):
+        self.cache = TieredCache()
+
+    def tearDown(self):
+        self.cache.delete('tiered-test')
+
+    def test_decoded_objects_are_kept_in_process(self):
+        value = {'data': [1, 2, 3]}
+        self.cache.set('tiered-test', value)
+        self.assertIs(self.cache.get('tiered-test'), value)  # No unpickling
+        self.assertEqual(cache.get('tiered-test'), value)  # But the shared backend has it too
+        self.assertEqual(TieredCache().get('tiered-test'), value)  # As another process would see it
+        self.cache.delete('tiered-test')
+        self.assertIsNone(self.cache.get('tiered-test'))
+
+    def test_compressed_entries_are_decoded_once(self):
+        value = {'data': ['news'] * 1000}
+        self.cache.set('tiered-test', Compressed(value))
+        self.assertIs(self.cache.get('tiered-test'), value)
+        self.assertIsInstance(cache.get('tiered-test'), Compressed)
+        self.assertLess(len(pickle.dumps(cache.get('tiered-test'), pickle.HIGHEST_PROTOCOL)),
+                        len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL)) / 10)
+        self.assertEqual(TieredCache().get('tiered-test'), value)
+
+    def test_local_entries_expire(self):
+        with self.settings(CRUNCHBASE_L1_TIMEOUT=-1):
+            self.cache.set('tiered-test', 'value')
+        cache.set('tiered-test', 'updated by another process')
+        self.assertEqual(self.cache.get('tiered-test'), 'updated by another process')
+
+    def test_hits_are_counted_by_tier(self):
+        self.cache.get('tiered-test')
+        self.cache.set('tiered-test', 'value')
+        self.cache.get('tiered-test')
+        TieredCache().get('tiered-test')  # Not in its first tier
+        self.assertEqual(self.cache.reset_hits(), {'l1': 1, 'l2': 0, 'miss': 1})
+        self.assertEqual(self.cache.hits, {'l1': 0, 'l2': 0, 'miss': 0})
+
+
+class RateLimiterTest(TestCase):
+    def test_interactive_requests_are_served_first(self):
+        limiter = upstream.RateLimiter(rate=20, burst=1)
+        self.assertTrue(limiter.acquire())  # The only token
+        order = []
+
+        def take(priority):
+            limiter.acquire(priority)
+            order.append(priority)
+
+        background = threading.Thread(target=take, args=(upstream.WARMING,))
+        background.start()
+        time.sleep(0.01)
+        interactive = threading.Thread(target=take, args=(upstream.INTERACTIVE,))
+        interactive.start()
+        background.join()
+        interactive.join()
+        self.assertEqual(order, [upstream.INTERACTIVE, upstream.WARMING])
+        self.assertEqual(limiter.queue_depth, 0)
+
+    def test_throttling_suspends_requests(self):
+        limiter = upstream.RateLimiter(rate=1000, burst=10)
+        limiter.throttled()
+        self.assertFalse(limiter.acquire(timeout=0.05))
+        self.assertEqual(limiter.backoff, 1)
+        limiter.throttled()
+        self.assertEqual(limiter.backoff, 2)
+        limiter.succeeded()
+        self.assertEqual(limiter.backoff, 1)
+
+    def test_throttled_responses_back_off(self):
+        response = mock.Mock(status_code=429, headers={'Retry-After': '5'}, content=b'')
+        with mock.patch.object(upstream.get_session(), 'get', return_value=response):
+            with mock.patch.object(upstream, '_limiter', upstream.RateLimiter(rate=1000, burst=10)) as limiter:
+                self.assertRaises(upstream.RateLimitExceeded, upstream.get, CrunchbaseEndpoint.BASE_URI + 'organizations')
+                self.assertEqual(limiter.backoff, 5)
+        self.assertTrue(response.close.called)
+
+    def test_streamed_responses_count_their_declared_length(self):
+        response = mock.Mock(status_code=200, headers={'Content-Length': '1234'})
+        before = metrics.registry.get('crunchbase_upstream_bytes_total')
+        with mock.patch.object(upstream.get_session(), 'get', return_value=response):
+            upstream.get(CrunchbaseEndpoint.BASE_URI + 'organizations', stream=True)
+        self.assertEqual(metrics.registry.get('crunchbase_upstream_bytes_total') - before, 1234)
+
+
+class WarmingTest(TestCase, CBSampleDataMixin):
+    def test_missing_and_stale_entries_are_refreshed(self):
+        fetch = mock.Mock(return_value='fresh')
+        with mock.patch('crunchbase.warming.get_cached', return_value=('old', False)):
+            self.assertEqual(warming.warm_entry('warming-test', fetch, 'list'), 'old')
+            self.assertFalse(fetch.called)
+        with mock.patch('crunchbase.views.set_cached') as set_cached_mock:
+            with mock.patch('crunchbase.warming.get_cached', return_value=('old', True)):
+                self.assertEqual(warming.warm_entry('warming-test', fetch, 'list'), 'fresh')
+            set_cached_mock.assert_called_once_with('warming-test', 'fresh', 'list')
+
+    def test_warmed_queries_match_the_searches(self):
+        companies = CrunchbaseQuery().companies.datastore
+        self.assertEqual(companies.search(' Cloud  Storage')._dataset_uri, companies.search('cloud storage')._dataset_uri)
+        with mock.patch('crunchbase.warming.warm_entry') as warm_entry:
+            warming.warm_query('companies', 'cloud storage')
+        self.assertEqual(warm_entry.call_args[0][0], companies.search('Cloud Storage').dataset_cache_key(1))
+
+    @override_settings(CRUNCHBASE_WARM_INTERVAL=None)
+    def test_scheduler_is_only_started_when_configured(self):
+        self.assertIsNone(warming.start_scheduler())
+
+    def test_pages_details_and_queries_are_warmed(self):
+        page = project_list_page(self.sample_list_json)
+        with mock.patch('crunchbase.warming.warm_entry', return_value=page) as warm_entry:
+            with mock.patch.object(warming.query_log, 'most_common', return_value=[(('companies', 'corpora'), 3)]):
+                warming.warm(pages=1, home_details=True, queries=1)
+        families = [call[0][2] for call in warm_entry.call_args_list]
+        # A page for each subset, the details of their items and the search
+        self.assertEqual(families.count('list'), 2)
+        self.assertEqual(families.count('detail'), 4)
+        self.assertEqual(families.count('search'), 1)
+
+    def test_recent_queries_are_counted(self):
+        log = QueryLog()
+        log.publish_every = 1000
+        with mock.patch('crunchbase.query_log.cache') as c:
+            c.get.return_value = {('companies', 'web'): 2}
+            log.record('companies', 'Corpora')
+            log.record('companies', ' corpora ')
+            log.record('products', 'web')
+            self.assertEqual(log.most_common(2), [(('companies', 'web'), 2), (('companies', 'corpora'), 2)])
+
+
+class StubServerTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = StubCrunchbaseServer(latency=0, total_items=1500).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def test_endpoints_are_served_by_the_stub(self):
+        with stub_upstream(self.server):
+            ep = CrunchbaseQuery().companies
+            page = ep.list(page=100, fetch_values=('properties__name',))
+            self.assertEqual(page['data']['paging']['total_items'], 1500)
+            self.assertEqual(page['data']['items'][0]['path'], 'organization/item-1000')
+            self.assertEqual(page['data']['items'][0]['properties__name'], page['data']['items'][0]['name'])
+            self.assertTrue(all('Cloud' in i['name'] for i in ep.datastore.search('cloud')[:10]))
+        self.assertNotEqual(CrunchbaseEndpoint.BASE_URI, self.server.base_uri)
+
+    def test_items_are_exported_as_ndjson(self):
+        with stub_upstream(self.server), \
+                mock.patch('crunchbase.views.get_detail_pool', side_effect=get_detail_pool) as detail_pool:
+            url = urlresolvers.reverse('crunchbase:export', kwargs={'subset': 'companies'})
+            response = self.client.get(url, {'cursor': 990, 'limit': 20, 'fields': 'properties__name'})
+            self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+            items = [json.loads(line) for line in ''.join(response.streaming_content).splitlines()]
+            self.assertFalse(detail_pool.called)  # Exports have their own pool, so that they can't starve the pages
+            self.assertEqual([i['path'] for i in items], ['organization/item-%s' % i for i in range(990, 1010)])
+            self.assertTrue(all(i['properties__name'] == i['name'] for i in items))
+            self.assertEqual(self.client.get(url, {'fields': 'password'}).status_code, 400)
+
+    def test_regressions_are_reported(self):
+        baseline = {'benchmarks': {'a': {'median_ms': 10}, 'b': {'median_ms': 10}}}
+        results = {'benchmarks': {'a': {'median_ms': 11}, 'b': {'median_ms': 13}, 'c': {'median_ms': 1}}}
+        self.assertEqual(micro.compare(results, baseline, tolerance=0.2), [('b', 10, 13)])
+
+    def test_load_mix_hits_the_views(self):
+        for kind in load.DEFAULT_MIX:
+            path, query = (load.random_path(kind, 100) + '?').split('?')[:2]
+            self.assertIn(urlresolvers.resolve(path).url_name, ('search', 'detail'))
+
+    def test_load_is_summarized_by_kind(self):
+        results = [('list', 200, i / 1000.0) for i in range(1, 101)] + [('detail', 500, 1)]
+        summary = load.summarize(results, elapsed=10)
+        self.assertEqual(summary['requests'], 101)
+        self.assertEqual(summary['errors'], 1)
+        self.assertAlmostEqual(summary['throughput_rps'], 10.1)
+        self.assertAlmostEqual(summary['by_kind']['list']['p50_ms'], 51)
+        self.assertAlmostEqual(summary['by_kind']['list']['p99_ms'], 100)
@@ -0,0 +1,130 @@
+"""
+Local copies of the item images, resized to the widths they are rendered at.
+
+Each image is downloaded from the image CDN the first time it's asked for, and kept on disk from then on: the image
+paths are versioned (eg. image/upload/v1411368785/k6fnzdjqhambbqsaxp2y.jpg), so a copy never goes stale. Only paths of
+that form are accepted, and the oldest copies are removed beyond CRUNCHBASE_THUMBNAIL_MAX_FILES. Resizing needs PIL (or
+Pillow); without it, the images are cached and served at their original size.
+"""
+import hashlib
+import io
+import mimetypes
+import os
+import posixpath
+import re
+import tempfile
+from django.conf import settings
+from django.core import urlresolvers
+import requests
+from crunchbase import upstream
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+RESIZABLE_FORMATS = ('JPEG', 'PNG')
+IMAGE_PATH_RE = re.compile(r'^image/upload/(?:[\w-]+/)*[\w-]+\.(?:jpe?g|png|gif)$', re.IGNORECASE)
+
+
+class ThumbnailError(Exception):
+    pass
+
+
+def get_sizes():
+    """
+    :return: :rtype: dict {size name: width in pixels}
+    """
+    return getattr(settings, 'CRUNCHBASE_THUMBNAIL_SIZES', {'row': 200, 'detail': 400})
+
+
+def thumbnail_url(image_path, size='row'):
+    """
+    :param image_path: path of the image relative to the image CDN, as found in the details
+    :param size: one of the names in CRUNCHBASE_THUMBNAIL_SIZES
+    :return: :rtype: str local url of the thumbnail
+    """
+    return urlresolvers.reverse('crunchbase:thumbnail', args=(size, image_path))
+
+
+def get_thumbnail_dir():
+    return getattr(settings, 'CRUNCHBASE_THUMBNAIL_DIR', os.path.join(tempfile.gettempdir(), 'pdtt-thumbnails'))
+
+
+def resize(data, width):
+    """
+    :param data: image bytes
+    :param width: max width, images are never enlarged
+    :return: :rtype: bytes the resized image, in the same format, or the original one if it can't be resized
+    """
+    if Image is None:
+        return data
+    try:
+        image = Image.open(io.BytesIO(data))
+        image_format = image.format
+        if image_format not in RESIZABLE_FORMATS or image.size[0] <= width:
+            return data
+        image.thumbnail((width, image.size[1] * width // image.size[0] or 1), Image.ANTIALIAS)
+        if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        output = io.BytesIO()
+        image.save(output, image_format, quality=85, optimize=True)
+    except (IOError, ValueError):  # Anything PIL can't make sense of is served as it is
+        return data
+    return output.getvalue()
+
+
+def cull(directory, keep):
+    """
+    Removes the least recently created thumbnails beyond CRUNCHBASE_THUMBNAIL_MAX_FILES, down to two thirds of it
+
+    :param keep: path of a file that must not be removed
+    """
+    max_files = getattr(settings, 'CRUNCHBASE_THUMBNAIL_MAX_FILES', 20000)
+    files = [os.path.join(root, name) for root, dirs, names in os.walk(directory) for name in names]
+    if len(files) <= max_files:
+        return
+    files = sorted((f for f in files if f != keep), key=lambda f: os.path.getmtime(f) if os.path.exists(f) else 0)
+    for path in files[:len(files) + 1 - max_files * 2 // 3]:
+        try:
+            os.remove(path)
+        except OSError:  # Removed in the meantime by another request
+            pass
+
+
+def get_thumbnail(image_path, size):
+    """
+    Returns the local copy of the thumbnail, creating it if needed
+
+    :param image_path: path of the image relative to the image CDN
+    :param size: one of the names in CRUNCHBASE_THUMBNAIL_SIZES
+    :return: :rtype: tuple (file path, ETag, content type)
+    :raise ThumbnailError: if the size or the path are not valid, or the image can't be downloaded
+    """
+    sizes = get_sizes()
+    if size not in sizes or not IMAGE_PATH_RE.match(image_path) or posixpath.normpath(image_path) != image_path:
+        raise ThumbnailError("Invalid thumbnail %s of %r" % (size, image_path))
+    # The width is part of the name, so that changing it in the settings doesn't serve the old copies
+    name = hashlib.sha1(('%s:%s' % (sizes[size], image_path)).encode('utf-8')).hexdigest()
+    file_path = os.path.join(get_thumbnail_dir(), name[:2], name + posixpath.splitext(image_path)[1])
+    if not os.path.exists(file_path):
+        url = getattr(settings, 'CRUNCHBASE_IMAGE_URI', 'http://images.crunchbase.com/') + image_path
+        try:
+            response = upstream.get_session().get(url, timeout=(getattr(settings, 'CRUNCHBASE_CONNECT_TIMEOUT', 3.05),
+                                                                getattr(settings, 'CRUNCHBASE_READ_TIMEOUT', 10)))
+            response.raise_for_status()
+        except requests.RequestException as e:
+            raise ThumbnailError("Can't download %s: %s" % (url, e))
+        if not os.path.isdir(os.path.dirname(file_path)):
+            try:
+                os.makedirs(os.path.dirname(file_path))
+            except OSError:  # Created in the meantime by another request
+                pass
+        # Written aside and then renamed, so that concurrent requests never see a partial file
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(file_path))
+        with os.fdopen(fd, 'wb') as f:
+            f.write(resize(response.content, sizes[size]))
+        os.rename(temp_path, file_path)
+        cull(get_thumbnail_dir(), keep=file_path)
+    content_type = mimetypes.guess_type(image_path)[0] or 'application/octet-stream'
+    return file_path, '"%s"' % name, content_type
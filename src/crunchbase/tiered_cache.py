@@ -0,0 +1,121 @@
+"""
+Two-tier cache: a small per-process LRU of decoded objects in front of the shared Django cache backend.
+
+Hits on the first tier cost neither unpickling nor I/O, while the second one is shared by all the workers, so that a new
+one doesn't start cold. The objects returned by the first tier are shared between threads, so they must be treated as
+read-only. Entries can be stored compressed in the second tier, while the first one always holds them decoded.
+"""
+import collections
+import cPickle as pickle
+import threading
+import time
+import zlib
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from crunchbase import metrics
+
+
+class Compressed(object):
+    """
+    Marks a value to be stored in the second tier as a zlib-compressed pickle, eg.
+
+        cache.set(key, Compressed(value))
+
+    The first tier keeps the value itself, and get() always returns it decoded.
+    """
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __getstate__(self):
+        # Compressed only when the backend pickles it
+        return zlib.compress(pickle.dumps(self.value, pickle.HIGHEST_PROTOCOL),
+                             getattr(settings, 'CRUNCHBASE_COMPRESS_LEVEL', 6))
+
+    def __setstate__(self, state):
+        self.value = pickle.loads(zlib.decompress(state))
+
+
+class TieredCache(object):
+    def __init__(self, alias='default'):
+        self.alias = alias
+        self._local = collections.OrderedDict()  # key: (value, expiry time)
+        self._lock = threading.Lock()
+        self.hits = {'l1': 0, 'l2': 0, 'miss': 0}  # Outcomes of get(), approximate since they're not locked
+
+    @property
+    def backend(self):
+        return caches[self.alias]
+
+    def _get_local(self, key):
+        with self._lock:
+            entry = self._local.pop(key, None)
+            if entry is None or entry[1] < time.time():
+                return None
+            self._local[key] = entry
+            return entry[0]
+
+    def _set_local(self, key, value, timeout=DEFAULT_TIMEOUT):
+        local_timeout = getattr(settings, 'CRUNCHBASE_L1_TIMEOUT', 60)
+        if timeout is not DEFAULT_TIMEOUT and timeout is not None:
+            local_timeout = min(local_timeout, timeout)
+        with self._lock:
+            self._local.pop(key, None)
+            self._local[key] = (value, time.time() + local_timeout)
+            while len(self._local) > getattr(settings, 'CRUNCHBASE_L1_MAX_ENTRIES', 500):
+                self._local.popitem(last=False)
+
+    def get(self, key, default=None):
+        with metrics.timed('cache'):
+            value = self._get_local(key)
+            if value is None:
+                value = self.backend.get(key)
+                tier = 'miss' if value is None else 'l2'
+                if isinstance(value, Compressed):
+                    value = value.value
+                if value is not None:
+                    self._set_local(key, value)
+            else:
+                tier = 'l1'
+        self.hits[tier] += 1
+        metrics.registry.inc('crunchbase_cache_gets_total', tier=tier)
+        return default if value is None else value
+
+    def reset_hits(self):
+        """
+        :return: :rtype: dict the outcomes of get() since the last reset
+        """
+        hits, self.hits = self.hits, dict.fromkeys(self.hits, 0)
+        return hits
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT):
+        with metrics.timed('cache'):
+            self.backend.set(key, value, timeout)
+            self._set_local(key, value.value if isinstance(value, Compressed) else value, timeout)
+        metrics.registry.inc('crunchbase_cache_sets_total')
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT):
+        # Only used for locks, which must be seen by all the processes
+        return self.backend.add(key, value, timeout)
+
+    def delete(self, key):
+        with self._lock:
+            self._local.pop(key, None)
+        self.backend.delete(key)
+
+    def delete_many(self, keys):
+        for key in keys:
+            self.delete(key)
+
+    def __contains__(self, key):
+        return self._get_local(key) is not None or key in self.backend
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+        self.backend.clear()
+
+
+cache = TieredCache()
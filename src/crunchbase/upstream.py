@@ -0,0 +1,220 @@
+"""
+Shared HTTP client for the Crunchbase API.
+
+Every upstream call goes through get(), so that all of them reuse the same pooled, keep-alive connections instead of
+opening a new one each time, and are paced by the same rate limiter, which serves interactive requests before the
+background ones.
+"""
+from contextlib import contextmanager
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+import requests
+from crunchbase import metrics
+
+# Priority classes, lower is served first
+INTERACTIVE = 0
+PREFETCH = 1
+WARMING = 2
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+_limiter = None
+_local = threading.local()
+
+
+class RateLimitExceeded(Exception):
+    pass
+
+
+class RateLimiter(object):
+    """
+    Token bucket shared by the upstream calls of the process; callers waiting for a token are served by priority, and
+    the rate is backed off when the API signals throttling.
+    """
+    max_backoff = 60
+
+    def __init__(self, rate, burst):
+        """
+        :param rate: tokens per second
+        :param burst: max number of tokens that can be accumulated
+        """
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.backoff = 0
+        self.backoff_until = 0
+        self._updated = time.time()
+        self._waiting = []  # Heap of (priority, sequence number)
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+
+    @property
+    def queue_depth(self):
+        return len(self._waiting)
+
+    def stats(self):
+        return {'queue_depth': self.queue_depth, 'tokens': self.tokens, 'backoff': self.backoff}
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, priority=INTERACTIVE, timeout=None):
+        """
+        Waits for a token
+
+        :param priority: one of INTERACTIVE, PREFETCH and WARMING
+        :param timeout: max number of seconds to wait
+        :return: :rtype: bool False if the timeout expired
+        """
+        deadline = time.time() + timeout if timeout is not None else None
+        ticket = (priority, next(self._sequence))
+        with self._condition:
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    now = time.time()
+                    self._refill(now)
+                    if self._waiting[0] == ticket:
+                        if self.tokens >= 1 and now >= self.backoff_until:
+                            self.tokens -= 1
+                            return True
+                        wait = max(self.backoff_until - now, (1 - self.tokens) / self.rate)
+                    else:
+                        wait = None  # Woken up when the ones before get their token
+                    if deadline is not None:
+                        if now >= deadline:
+                            return False
+                        wait = min(wait, deadline - now) if wait is not None else deadline - now
+                    self._condition.wait(wait)
+            finally:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._condition.notify_all()
+
+    def throttled(self, retry_after=None):
+        """
+        Called when the API signals throttling: all the requests are suspended, for twice as long as the last time
+        """
+        with self._condition:
+            self.backoff = min(max(self.backoff * 2, 1, retry_after or 0), self.max_backoff)
+            self.backoff_until = time.time() + self.backoff
+            self.tokens = 0
+
+    def retry_after(self):
+        """
+        :return: :rtype: int seconds a client should wait before trying again, at least one
+        """
+        return max(int(math.ceil(self.backoff_until - time.time())), 1)
+
+    def succeeded(self):
+        if self.backoff:
+            with self._condition:
+                self.backoff = self.backoff / 2 if self.backoff > 1 else 0
+
+
+def get_limiter():
+    """
+    :return: :rtype: RateLimiter
+    """
+    global _limiter
+    if _limiter is None:
+        with _session_lock:
+            if _limiter is None:
+                _limiter = RateLimiter(getattr(settings, 'CRUNCHBASE_RATE_LIMIT', 10),
+                                       getattr(settings, 'CRUNCHBASE_RATE_BURST', 20))
+    return _limiter
+
+
+def current_priority():
+    return getattr(_local, 'priority', INTERACTIVE)
+
+
+@contextmanager
+def priority(level):
+    """
+    Sets the priority of the upstream calls made by the current thread within the block
+    """
+    previous = current_priority()
+    _local.priority = level
+    try:
+        yield
+    finally:
+        _local.priority = previous
+
+
+def run_with_priority(level, func, *args, **kwargs):
+    # Handy for tasks running in a pool
+    with priority(level):
+        return func(*args, **kwargs)
+
+
+def get_session():
+    """
+    Returns the per-process Session; a new one is created after a fork, since the pooled sockets can't be shared.
+
+    :return: :rtype: requests.Session
+    """
+    global _session, _session_pid
+    if _session is None or _session_pid != os.getpid():
+        with _session_lock:
+            if _session is None or _session_pid != os.getpid():
+                pool_size = getattr(settings, 'CRUNCHBASE_POOL_SIZE', 10)
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                session.headers.update({'Accept': 'application/json', 'Accept-Encoding': 'gzip, deflate'})
+                _session, _session_pid = session, os.getpid()
+    return _session
+
+
+def get(url, params=None, **kwargs):
+    """
+    GETs an API url with the user key and the configured timeouts.
+
+    :param url: full API url
+    :param params: query parameters, the user key is added here
+    :return: :rtype: requests.Response
+    :raise RateLimitExceeded: if an interactive request could not be made within the connect timeout, or if the API
+        throttled it (429 or 503), so that the error is never cached as data
+    """
+    params = dict(params or {}, user_key=settings.CRUNCHBASE_USER_KEY)
+    connect_timeout = getattr(settings, 'CRUNCHBASE_CONNECT_TIMEOUT', 3.05)
+    kwargs.setdefault('timeout', (connect_timeout, getattr(settings, 'CRUNCHBASE_READ_TIMEOUT', 10)))
+    level = current_priority()
+    limiter = get_limiter()
+    waiting_since = time.time()
+    # Background requests can wait for as long as it takes
+    if not limiter.acquire(level, timeout=connect_timeout if level == INTERACTIVE else None):
+        metrics.registry.inc('crunchbase_rate_limited_total')
+        raise RateLimitExceeded("No upstream request slot available for %s" % url)
+    metrics.registry.inc('crunchbase_rate_limiter_wait_seconds_total', time.time() - waiting_since)
+    try:
+        with metrics.timed('upstream'):
+            response = get_session().get(url, params=params, **kwargs)
+    except requests.RequestException:
+        metrics.registry.inc('crunchbase_upstream_errors_total')
+        raise
+    metrics.registry.inc('crunchbase_upstream_responses_total', status=response.status_code)
+    if kwargs.get('stream'):  # Read while they are decoded, so only their declared length is known here
+        length = response.headers.get('Content-Length')
+        nbytes = int(length) if length and length.isdigit() else 0
+    else:
+        nbytes = len(response.content)
+    metrics.registry.inc('crunchbase_upstream_bytes_total', nbytes)
+    if response.status_code in (429, 503):
+        retry_after = response.headers.get('Retry-After')
+        limiter.throttled(int(retry_after) if retry_after and retry_after.isdigit() else None)
+        response.close()
+        raise RateLimitExceeded("Throttled by the upstream API (%s) for %s" % (response.status_code, url))
+    else:
+        limiter.succeeded()
+    return response
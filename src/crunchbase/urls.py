@@ -1,5 +1,7 @@
 from django.conf.urls import patterns, include, url
-from crunchbase.views import CrunchbaseSearchView, CrunchbaseHomeSearchView, CrunchbaseDetailView
+from crunchbase.api import CrunchbaseExportView
+from crunchbase.views import CrunchbaseSearchView, CrunchbaseHomeSearchView, CrunchbaseDetailView, \
+    CrunchbaseMetricsView, CrunchbaseThumbnailView
 
 
 urlpatterns = patterns(
@@ -7,4 +9,7 @@ urlpatterns = patterns(
     url(r'^search/$', CrunchbaseHomeSearchView.as_view(), name='search'),
     url(r'^search/(?P<subset>companies|products)/$', CrunchbaseSearchView.as_view(), name='search'),
     url(r'^detail/(?P<path>.+)/$', CrunchbaseDetailView.as_view(), name='detail'),
+    url(r'^thumbnail/(?P<size>\w+)/(?P<path>.+)$', CrunchbaseThumbnailView.as_view(), name='thumbnail'),
+    url(r'^api/(?P<subset>companies|products)/$', CrunchbaseExportView.as_view(), name='export'),
+    url(r'^metrics/$', CrunchbaseMetricsView.as_view(), name='metrics'),
 )
@@ -1,58 +1,664 @@
-from UserDict import UserDict
 import collections
 from django.conf import settings
-from django.core.cache import cache
-from django.core.paginator import Paginator
-from django.http import Http404, QueryDict
+import hashlib
+from django.core.paginator import EmptyPage, InvalidPage, Page, PageNotAnInteger, Paginator
+from django.http import Http404, HttpResponse, HttpResponseNotModified, QueryDict
 from django.utils.encoding import smart_unicode
 from django.utils.text import slugify
 from django.views.generic import ListView
-from django.views.generic.base import TemplateView
-from math import ceil
-import requests
+from django.views.generic.base import TemplateView, View
+from functools import partial
+from multiprocessing import TimeoutError
+from multiprocessing.pool import ThreadPool
+from crunchbase import metrics, upstream
+from crunchbase.fields import FIELD_EXTRACTORS, get_primary_image, project_fields
+from crunchbase.models import MIRROR_MODELS
+from crunchbase.query_log import normalize_query, query_log
+from crunchbase.search_index import get_index
+from crunchbase.thumbnails import ThumbnailError, get_thumbnail
+from crunchbase.tiered_cache import Compressed, cache
+import sys
+import threading
+import time
 import urlparse
+import uuid
 
+try:
+    from ijson.backends import yajl2 as ijson
+    from ijson.common import ObjectBuilder
+except ImportError:  # The pure python backend would be slower than the json module, so we don't bother with it
+    ijson = None
 
-class CrunchbasePaginator(Paginator):
-    def __init__(self, object_list, per_page, orphans=0, allow_empty_first_page=True, **kwargs):
-        # We need to override this to set the correct number of 1000-items pages
-        super(CrunchbasePaginator, self).__init__(object_list, per_page, orphans, allow_empty_first_page)
-        self._count = kwargs.pop('actual_objects_count')
-        self._num_pages = int(ceil(self._count / per_page))
 
+_detail_pool = None
+_detail_pool_lock = threading.Lock()
+_export_pool = None
+_export_pool_lock = threading.Lock()
 
-class CrunchbaseSearchView(ListView):
+
+def get_detail_pool():
+    """
+    Returns the process-wide thread pool used to fetch item details; it's created lazily so that the number of workers can
+    be set in the settings.
+
+    :return: :rtype: ThreadPool
+    """
+    global _detail_pool
+    if _detail_pool is None:
+        with _detail_pool_lock:
+            if _detail_pool is None:
+                _detail_pool = ThreadPool(getattr(settings, 'CRUNCHBASE_FETCH_WORKERS', 10))
+    return _detail_pool
+
+
+def get_export_pool():
+    """
+    Returns the process-wide thread pool used by the exports, so that a few long exports can't take all the workers the
+    pages need.
+
+    :return: :rtype: ThreadPool
+    """
+    global _export_pool
+    if _export_pool is None:
+        with _export_pool_lock:
+            if _export_pool is None:
+                _export_pool = ThreadPool(getattr(settings, 'CRUNCHBASE_EXPORT_WORKERS', 4))
+    return _export_pool
+
+
+UPSTREAM_PAGE_SIZE = 1000  # items_per_page of the upstream list pages
+
+# Only these fields are kept in the cache, since they are the only ones used by the views and the templates
+LIST_ITEM_FIELDS = ('path', 'name', 'type')
+DETAIL_PROPERTIES = ('name', 'permalink', 'short_description', 'description')
+# Relationship: (fields of its items, number of items), as rendered by the detail page; None keeps all of them
+DETAIL_RELATIONSHIPS = {
+    'primary_image': (('path', 'title'), 1),
+    'current_team': (('title', 'first_name', 'last_name', 'path'), None),
+    'news': (('author', 'url', 'title', 'posted_on'), 5),
+}
+
+
+def project_list_page(page_json):
+    """
+    Prunes a decoded list page down to what the search tables need (about a tenth of the original)
+
+    :param page_json: decoded output of a Crunchbase list verb
+    :return: :rtype: dict
+    """
+    data = page_json['data']
+    projected = {
+        'paging': data.get('paging'),
+        'items': [dict((k, item.get(k)) for k in LIST_ITEM_FIELDS) for item in data.get('items', [])]
+    }
+    if data.get('error'):  # Needed by CrunchbaseEndpoint.handle_errors
+        projected['error'] = data['error']
+    return {'metadata': page_json.get('metadata', {}), 'data': projected}
+
+
+def project_detail(detail_json):
+    """
+    Prunes a decoded detail down to the properties and relationships used by the result tables and the detail page,
+    keeping the original structure; the relationships keep only the items that are displayed, with their rendered fields,
+    so that the details of large organizations (with thousands of relationships) take about as much as the others.
+
+    :param detail_json: decoded output of a Crunchbase detail verb
+    :return: :rtype: dict
+    """
+    data = detail_json['data']
+    properties = data.get('properties', {})
+    relationships = data.get('relationships', {})
+    projected = {
+        'type': data.get('type'),
+        'properties': dict((k, properties.get(k)) for k in DETAIL_PROPERTIES),
+        'relationships': {},
+    }
+    for name, (fields, limit) in DETAIL_RELATIONSHIPS.items():
+        if name in relationships:
+            items = relationships[name].get('items', [])[:limit]
+            projected['relationships'][name] = {'items': [dict((k, item.get(k)) for k in fields) for item in items]}
+    if data.get('error'):
+        projected['error'] = data['error']
+    return {'metadata': detail_json.get('metadata', {}), 'data': projected}
+
+
+def get_cached(cache_key):
+    """
+    Reads an entry written by set_cached
+
+    :return: :rtype: tuple (data or None, True if the entry is past its soft timeout)
+    """
+    entry = cache.get(cache_key)
+    if entry is None:
+        return None, False
+    return entry['data'], entry['refresh_at'] < time.time()
+
+
+def get_timeouts(family):
+    """
+    :param family: kind of entry (list, search or detail)
+    :return: :rtype: tuple (soft timeout, hard timeout) in seconds
+    """
+    return getattr(settings, 'CRUNCHBASE_CACHE_TIMEOUTS', {}).get(family, (1800, 3600))
+
+
+def set_cached(cache_key, data, family):
+    """
+    Stores the data until the hard timeout of its family, marking it for refresh after the soft one; each write gets a
+    new version, which the pages built from the entry are checked against.
+    """
+    soft_timeout, hard_timeout = get_timeouts(family)
+    entry = {'data': data, 'refresh_at': time.time() + soft_timeout, 'version': uuid.uuid4().hex}
+    if family in getattr(settings, 'CRUNCHBASE_COMPRESSED_FAMILIES', ('detail',)):
+        entry = Compressed(entry)
+    cache.set(cache_key, entry, hard_timeout)
+
+
+def get_version(cache_key):
+    """
+    :return: :rtype: tuple (version of the entry or None, True if the entry is past its soft timeout)
+    """
+    entry = cache.get(cache_key)
+    if entry is None:
+        return None, False
+    return entry.get('version'), entry['refresh_at'] < time.time()
+
+
+def refresh_in_background(cache_key, fetch, family):
+    """
+    Schedules a refresh of a stale entry, unless another one is already running for the same key
+
+    :param fetch: callable returning the new data
+    :param family: kind of entry, for its timeouts
+    """
+    lock_key = 'refreshing-%s' % cache_key
+    if not cache.add(lock_key, True, get_fetch_timeout()):
+        return
+
+    def refresh():
+        try:
+            with upstream.priority(upstream.PREFETCH):
+                set_cached(cache_key, fetch(), family)
+        finally:
+            cache.delete(lock_key)
+
+    get_detail_pool().apply_async(refresh)
+
+
+def fetch_projected(url, projection, params=None):
+    response = upstream.get(url, params=params)
+    with metrics.timed('json'):
+        return projection(response.json())
+
+
+def stream_list_page(stream):
+    """
+    Decodes a list page incrementally, building only the projected fields of the items instead of the whole page; the
+    result is the same as project_list_page's.
+
+    :param stream: file-like object with the JSON response
+    :return: :rtype: dict
+    """
+    page = {'metadata': {}, 'data': {'paging': None, 'items': []}}
+    item_fields = dict(('data.items.item.%s' % k, k) for k in LIST_ITEM_FIELDS)
+    item = None
+    events = ijson.parse(stream)
+    for prefix, event, value in events:
+        if prefix == 'data.items.item':
+            if event == 'start_map':
+                item = dict.fromkeys(LIST_ITEM_FIELDS)
+            elif event == 'end_map':
+                page['data']['items'].append(item)
+        elif prefix in item_fields:
+            item[item_fields[prefix]] = value
+        elif prefix in ('metadata', 'data.paging', 'data.error'):
+            if event in ('start_map', 'start_array'):
+                start_prefix, end_event = prefix, event.replace('start', 'end')
+                builder = ObjectBuilder()
+                while (prefix, event) != (start_prefix, end_event):
+                    builder.event(event, value)
+                    prefix, event, value = next(events)
+                prefix, value = start_prefix, builder.value
+            if prefix == 'metadata':
+                page['metadata'] = value
+            elif value:
+                page['data'][prefix.split('.')[1]] = value
+    return page
+
+
+def fetch_list_page(url, params=None):
+    """
+    Fetches and projects a list page, decoding it as it's downloaded when a C ijson backend is available and
+    CRUNCHBASE_STREAM_LIST_PAGES is set, so that the whole page is never built in memory.
+    """
+    if ijson is None or not getattr(settings, 'CRUNCHBASE_STREAM_LIST_PAGES', False):
+        return fetch_projected(url, project_list_page, params)
+    response = upstream.get(url, params=params, stream=True)
+    response.raw.decode_content = True  # gzip
+    try:
+        with metrics.timed('json'):  # Including the download, which happens as the page is decoded
+            return stream_list_page(response.raw)
+    finally:
+        response.close()
+
+
+class Flight(object):
+    # A fetch in progress, that other threads can wait for
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def fetch_once(cache_key, fetch, family):
+    """
+    Fetches and caches the data for a key that was not found in the cache, making sure that concurrent misses for the
+    same key result in a single upstream request: within the process the other threads wait for the first one, while
+    across processes (with a shared cache backend) a lock entry makes the others wait for the value to show up in the
+    cache.
+
+    :param fetch: callable returning the data to be cached
+    :param family: kind of entry, for its timeouts
+    :return: the fetched data
+    """
+    with _flights_lock:
+        flight = _flights.get(cache_key)
+        leader = flight is None
+        if leader:
+            flight = _flights[cache_key] = Flight()
+    if not leader:
+        if not flight.done.wait(get_fetch_timeout()):
+            return fetch()  # Something is wrong with the first request, better try on our own
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+    try:
+        flight.result = fetch_across_processes(cache_key, fetch, family)
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        with _flights_lock:
+            del _flights[cache_key]
+        flight.done.set()
+    return flight.result
+
+
+def fetch_across_processes(cache_key, fetch, family):
+    """
+    Fetches the entry unless another process is already fetching it, in which case its result is waited for; the lock
+    is only as reliable as the add() of the cache backend, which is atomic with memcached but not with the file based one.
+    """
+    lock_key = 'fetching-%s' % cache_key
+    timeout = get_fetch_timeout()
+    if not cache.add(lock_key, True, timeout):
+        # Another process is already on it, so we poll the cache until its result appears or the lock expires
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            time.sleep(0.05)
+            data, stale = get_cached(cache_key)
+            if data is not None:
+                return data
+    try:
+        data = fetch()
+        set_cached(cache_key, data, family)
+    finally:
+        cache.delete(lock_key)
+    return data
+
+
+def get_fetch_timeout():
+    return getattr(settings, 'CRUNCHBASE_CONNECT_TIMEOUT', 3.05) + getattr(settings, 'CRUNCHBASE_READ_TIMEOUT', 10)
+
+
+def cached_get(cache_key, fetch, family):
+    """
+    Returns the projected JSON for the key, from the cache if possible; only the projection is stored, so that cache hits
+    don't have to unpickle and decode the whole response. Stale entries are served as they are while they get refreshed.
+
+    :param cache_key: key to store the projected data with
+    :param fetch: callable returning the projected data from the API (eg. fetch_list_page with its arguments)
+    :param family: kind of entry, for its timeouts
+    :return: :rtype: dict
+    """
+    data, stale = get_cached(cache_key)
+    if data is None:
+        data = fetch_once(cache_key, fetch, family)
+    elif stale:
+        refresh_in_background(cache_key, fetch, family)
+    return data
+
+
+def fetch_concurrently(calls, timeout=None):
+    """
+    Runs the callables in the fetch pool, returning their results in the same order; the callables must not wait on the
+    pool themselves (eg. by calling fetch_details), or they could starve it.
+
+    :param calls: iterable of callables without arguments
+    :param timeout: seconds to wait for all of them
+    :return: :rtype: list
+    :raise multiprocessing.TimeoutError: if the results are not ready in time
+    """
+    deadline = time.time() + timeout if timeout is not None else None
+    pending = [get_detail_pool().apply_async(metrics.bind(call)) for call in calls]
+    return [p.get(max(deadline - time.time(), 0) if deadline is not None else None) for p in pending]
+
+
+def fetch_details(api_path_prefix, paths, timeout=None, pool=None):
+    """
+    Retrieves the projected details for all the given paths, hitting the API concurrently for those that are not cached yet,
+    so that a whole page of items costs roughly one round trip instead of one per item. This is the only way details are
+    read, so list pages, querysets and the detail page all share the same entries.
+
+    :param api_path_prefix: base uri the paths are relative to
+    :param paths: iterable of item paths (eg. organization/web-tools-weekly)
+    :param timeout: seconds to wait for the concurrent requests; the details that are not fetched by then are left out
+    :param pool: thread pool making the requests, defaults to get_detail_pool()
+    :return: :rtype: dict {path: projected detail}
+    """
+    details = {}
+    missing = []
+    for path in paths:
+        if path in details or path in missing:
+            continue
+        detail, stale = get_cached(path)
+        if detail is None:
+            missing.append(path)
+        else:
+            details[path] = detail
+            if stale:
+                refresh_in_background(path, partial(fetch_projected, api_path_prefix + path, project_detail), 'detail')
+
+    def fetch(path):
+        return path, fetch_once(path, partial(fetch_projected, api_path_prefix + path, project_detail), 'detail')
+
+    if len(missing) == 1:  # No need to bother the pool for a single request
+        fetched = [fetch(missing[0])]
+    elif missing:
+        # The pool threads make the requests with the caller's priority, eg. so that exports don't delay the pages
+        fetch = partial(upstream.run_with_priority, upstream.current_priority(), fetch)
+        try:
+            fetched = (pool or get_detail_pool()).map_async(metrics.bind(fetch), missing).get(timeout)
+        except TimeoutError:  # The cached ones are still returned, while the missing ones keep being fetched
+            fetched = []
+    else:
+        fetched = []
+    details.update(fetched)
+    return details
+
+
+def index_page(uri, page, page_json):
+    """
+    Adds the items of a list page to the local search index of its endpoint; search results pages are skipped.
+    """
+    items = page_json['data'].get('items')
+    if not items or urlparse.urlparse(uri).query:
+        return
+    get_index(uri).add_page(page, (page - 1) * page_json['data']['paging']['items_per_page'], items)
+
+
+def use_mirror():
+    return getattr(settings, 'CRUNCHBASE_USE_MIRROR', False)
+
+
+def approximate_size(obj):
+    """
+    Rough number of bytes used by a decoded JSON structure
+    """
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(approximate_size(k) + approximate_size(v) for k, v in obj.items())
+    elif isinstance(obj, list):
+        size += sum(approximate_size(i) for i in obj)
+    elif isinstance(obj, CrunchbaseItem):
+        size += sum(approximate_size(getattr(obj, k)) for k in LIST_ITEM_FIELDS)
+    return size
+
+
+class PageLRU(object):
+    """
+    Least recently used store of decoded upstream pages, bounded by their approximate size; the most recent page is always
+    kept, however big it is.
+    """
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._pages = collections.OrderedDict()
+
+    def __contains__(self, page):
+        return page in self._pages
+
+    def __len__(self):
+        return len(self._pages)
+
+    def get(self, page):
+        try:
+            entry = self._pages.pop(page)
+        except KeyError:
+            return None
+        self._pages[page] = entry
+        return entry[0]
+
+    def set(self, page, data):
+        if page in self._pages:
+            self.size -= self._pages.pop(page)[1]
+        nbytes = approximate_size(data)
+        self._pages[page] = (data, nbytes)
+        self.size += nbytes
+        while self.size > self.max_bytes and len(self._pages) > 1:
+            evicted_data, evicted_bytes = self._pages.popitem(last=False)[1]
+            self.size -= evicted_bytes
+
+
+class PageCacheMixin(object):
+    """
+    Caches the rendered pages together with the versions of the cache entries they were built from, and serves them
+    (or a 304, when the browser has the same ETag) without building the context or rendering, until one of those entries
+    is refreshed or goes stale.
+
+    Views define page_cache_key() and page_dependencies(); either can return None for pages that can't be cached, which
+    is what the defaults do for the key, so that nothing is cached until a view says how.
+    """
+    cache_control = 'public, no-cache'  # Browsers and proxies can keep the pages, but they have to check the ETag
+
+    def page_cache_key(self):
+        """
+        :return: :rtype: unicode identifying the page among those of all the views, or None not to cache it
+        """
+        return None
+
+    def page_dependencies(self):
+        """
+        :return: :rtype: list of the cache keys the page was built from, or None not to cache it
+        """
+        return []
+
+    def get_cached_page(self, key):
+        page = cache.get(key)
+        if page is None:
+            return None
+        for dependency, version in page['dependencies']:
+            current, stale = get_version(dependency)
+            # Stale pages are rendered again, so that their entries get refreshed as usual
+            if current != version or stale:
+                return None
+        return page
+
+    def conditional_response(self, response, etag):
+        response['ETag'] = etag
+        response['Cache-Control'] = self.cache_control
+        if etag in [t.strip() for t in self.request.META.get('HTTP_IF_NONE_MATCH', '').split(',')]:
+            # Changed in place, since the response can't be replaced once UpstreamUnavailableMiddleware has rendered it
+            response.status_code = 304
+            response.content = b''
+            del response['Content-Type']
+        return response
+
+    def store_page(self, key, response):
+        etag = '"%s"' % hashlib.md5(response.content).hexdigest()
+        dependencies = self.page_dependencies()
+        if dependencies is not None:
+            versions = [(dependency, get_version(dependency)[0]) for dependency in dependencies]
+            if all(version is not None for dependency, version in versions):
+                cache.set(key, {'content': response.content, 'content_type': response['Content-Type'], 'etag': etag,
+                                'dependencies': versions}, getattr(settings, 'CRUNCHBASE_PAGE_CACHE_TIMEOUT', 3600))
+        return self.conditional_response(response, etag)
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method != 'GET' or not getattr(settings, 'CRUNCHBASE_PAGE_CACHE', False) or use_mirror():
+            return super(PageCacheMixin, self).dispatch(request, *args, **kwargs)
+        key = self.page_cache_key()
+        if key is not None:
+            key = 'page-%s' % hashlib.md5(key.encode('utf-8')).hexdigest()
+            page = self.get_cached_page(key)
+            metrics.registry.inc('crunchbase_page_cache_total', result='miss' if page is None else 'hit')
+            if page is not None:
+                return self.conditional_response(HttpResponse(page['content'], content_type=page['content_type']),
+                                                 page['etag'])
+        response = super(PageCacheMixin, self).dispatch(request, *args, **kwargs)
+        if key is not None and response.status_code == 200 and hasattr(response, 'add_post_render_callback'):
+            response.add_post_render_callback(partial(self.store_page, key))
+        return response
+
+
+class CursorPage(Page):
+    """
+    A page of items, with the cursors of its neighbours: a cursor is the offset of the first item of a page, which can be
+    passed in the `cursor` parameter instead of a page number
+    """
+    def __init__(self, object_list, number, paginator, offset):
+        super(CursorPage, self).__init__(object_list, number, paginator)
+        self.offset = offset
+
+    def start_index(self):
+        return self.offset + 1 if self.object_list else 0
+
+    def end_index(self):
+        return self.offset + len(self.object_list)
+
+    @property
+    def upstream_page(self):
+        # The 1-based number of the upstream page the first item is in
+        return self.offset // self.paginator.object_list.paging['items_per_page'] + 1
+
+    @property
+    def next_cursor(self):
+        return self.offset + self.paginator.per_page if self.end_index() < self.paginator.count else None
+
+    @property
+    def previous_cursor(self):
+        return max(self.offset - self.paginator.per_page, 0) if self.offset > 0 else None
+
+
+class CursorPaginator(Paginator):
+    """
+    Paginator for a CrunchbaseQueryset, mapping each page straight onto the upstream page (or pages) that hold its items:
+    only those are fetched, and the total comes from their paging block, so nothing is fetched just to count the items
+    or to check the page number.
+    """
+    def validate_number(self, number):
+        # Whether the page exists can only be told once its items are fetched, so only the format is checked here
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('That page number is not an integer')
+        if number < 1:
+            raise EmptyPage('That page number is less than 1')
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        return self.page_at((number - 1) * self.per_page)
+
+    def page_at(self, cursor):
+        """
+        :param cursor: offset of the first item of the page
+        :return: :rtype: CursorPage
+        :raise EmptyPage: if there are no items there
+        """
+        try:
+            cursor = int(cursor)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('That cursor is not an integer')
+        if cursor < 0:
+            raise EmptyPage('That cursor is less than 0')
+        object_list = self.object_list[cursor:cursor + self.per_page]
+        if not object_list and (cursor > 0 or not self.allow_empty_first_page):
+            raise EmptyPage('That page contains no results')
+        return CursorPage(object_list, cursor // self.per_page + 1, self, cursor)
+
+
+class CrunchbaseSearchView(PageCacheMixin, ListView):
     template_name = 'crunchbase/search_results.html'
     context_object_name = 'search_results'
     subset_name = ''
     subset = None
     paginate_by = 10
+    page_paths = ()
 
     def get_paginator(self, queryset, per_page, orphans=0, allow_empty_first_page=True, **kwargs):
-        kwargs['actual_objects_count'] = self.cb_page_data.get('items_per_page', 0) * self.cb_page_data.get('number_of_pages', 0)
-        return CrunchbasePaginator(queryset, per_page, orphans, allow_empty_first_page, **kwargs)
+        if use_mirror():
+            return Paginator(queryset, per_page, orphans, allow_empty_first_page, **kwargs)
+        return CursorPaginator(queryset, per_page, orphans, allow_empty_first_page, **kwargs)
+
+    def paginate_queryset(self, queryset, page_size):
+        cursor = self.request.GET.get('cursor')
+        if cursor is None or use_mirror():
+            return super(CrunchbaseSearchView, self).paginate_queryset(queryset, page_size)
+        paginator = self.get_paginator(queryset, page_size, orphans=self.get_paginate_orphans(),
+                                       allow_empty_first_page=self.get_allow_empty())
+        try:
+            page = paginator.page_at(cursor)
+        except InvalidPage as e:
+            raise Http404("Invalid cursor (%s): %s" % (cursor, e))
+        return paginator, page, page.object_list, page.has_other_pages()
 
     def __init__(self, **kwargs):
         super(CrunchbaseSearchView, self).__init__(**kwargs)
         self.crunchbase = CrunchbaseQuery()
-        self.cb_page_data = {}  # CrunchBase original pagination data
 
     def dispatch(self, request, *args, **kwargs):
         if kwargs.get('subset'):
             self.subset_name = kwargs['subset']
             self.subset = getattr(self.crunchbase, self.subset_name)
+            if request.GET.get('query') and not use_mirror():  # Counted here, since cached pages skip get_queryset
+                query_log.record(self.subset_name, request.GET['query'])
         return super(CrunchbaseSearchView, self).dispatch(request, *args, **kwargs)
 
+    def page_cache_key(self):
+        # The raw query, since it's rendered in the links of the page
+        query = self.request.GET.get('query', '')
+        position = self.request.GET.get('cursor', '').strip() or self.request.GET.get(self.page_kwarg, '1').strip()
+        return u'search|%s|%s|%s|%s' % (self.subset_name, query, 'cursor' in self.request.GET, position)
+
+    def page_dependencies(self):
+        dependencies = self.object_list.cache_dependencies()
+        if dependencies is None:
+            return None
+        # The details of the rows whose fragments were cached have not been read, but the page depends on them too
+        return dependencies + [path for path in self.page_paths if path not in dependencies]
+
     def get_queryset(self):
+        if use_mirror():
+            objects = MIRROR_MODELS[CrunchbaseQuery.ENDPOINTS[self.subset_name]].objects
+            return objects.search(self.request.GET['query']) if self.request.GET.get('query') else objects.all()
         if self.request.GET.get('query'):  # Present and not empty
             subset_list = self.subset.datastore.search(self.request.GET['query'])
         else:
             subset_list = self.subset.datastore
-        self.cb_page_data = subset_list.paging
         return subset_list
 
     def get_context_data(self, **kwargs):
         data = super(CrunchbaseSearchView, self).get_context_data(**kwargs)
+        self.page_paths = [item['path'] for item in data['object_list']]
+        if not use_mirror():
+            # Fetched here rather than while rendering, where the include of the results table would swallow the errors
+            # (eg. RateLimitExceeded)
+            self.object_list.prefetch_values(data['object_list'])
         data['subset_name'] = self.subset_name
         data['query'] = self.request.GET.get('query', '')
         return data
@@ -60,15 +666,52 @@ class CrunchbaseSearchView(ListView):
 
 class CrunchbaseHomeSearchView(CrunchbaseSearchView):
     template_name = 'crunchbase/home.html'
+    subsets = ('companies', 'products')
+    fetch_values = ('properties__short_description', 'primary_image')
+    dependencies = None
+
+    def page_cache_key(self):
+        return u'home'
+
+    def page_dependencies(self):
+        return self.dependencies
 
     def get_context_data(self, **kwargs):
         data = super(CrunchbaseSearchView, self).get_context_data(**kwargs)
-        companies = self.crunchbase.companies.list(fetch_values=('properties__short_description', 'primary_image'))
-        data['companies_search_results'] = companies['data']['items']
-        products = self.crunchbase.products.list(fetch_values=('properties__short_description', 'primary_image'))
-        data['products_search_results'] = products['data']['items']
+        if use_mirror():
+            for subset in self.subsets:
+                model = MIRROR_MODELS[CrunchbaseQuery.ENDPOINTS[subset]]
+                data['%s_search_results' % subset] = model.objects.all()[:CrunchbaseEndpoint.per_page]
+            return data
+        # Both lists are fetched at the same time, and then all of their details together, so that the page costs two
+        # round trips at most
+        deadline = time.time() + getattr(settings, 'CRUNCHBASE_PAGE_TIMEOUT', 20)
+        endpoints = [getattr(self.crunchbase, subset) for subset in self.subsets]
+        pages = fetch_concurrently([ep.list for ep in endpoints], timeout=deadline - time.time())
+        paths = [item['path'] for page in pages for item in page['data']['items']]
+        details = fetch_details(CrunchbaseEndpoint.BASE_URI, paths, timeout=max(deadline - time.time(), 0))
+        if all(path in details for path in paths):
+            self.dependencies = [ep.datastore.dataset_cache_key(1) for ep in endpoints] + paths
+        else:
+            # The items past the deadline are shown without their details, which keep being fetched for the next
+            # requests; neither the page nor its rows are cached, since they're incomplete
+            data['degraded'] = True
+        for subset, ep, page in zip(self.subsets, endpoints, pages):
+            for item in page['data']['items']:
+                if item['path'] in details:
+                    item.update(ep.fetch_item_values(item['path'], self.fetch_values, details[item['path']]))
+            data['%s_search_results' % subset] = page['data']['items']
         return data
 
+    def get(self, request, *args, **kwargs):
+        try:
+            return super(CrunchbaseHomeSearchView, self).get(request, *args, **kwargs)
+        except TimeoutError:  # Not even the lists could be fetched in time
+            response = HttpResponse("The Crunchbase API is not responding, try again later", status=503,
+                                    content_type='text/plain')
+            response['Retry-After'] = getattr(settings, 'CRUNCHBASE_PAGE_TIMEOUT', 20)
+            return response
+
     def get_queryset(self):
         return []
 
@@ -90,21 +733,69 @@ class CrunchbaseQuery(object):
         raise AttributeError
 
 
-class CrunchbaseProxyObject(UserDict):
-    def __init__(self, dict=None, base_queryset=None, **kwargs):
+class CrunchbaseItem(object):
+    """
+    Compact list item: it holds only the fields rendered by the result tables, while the registered detail fields are
+    fetched on first access; it supports the same dict-style access as the upstream items, for the templates.
+    """
+    __slots__ = ('path', 'name', 'type', 'base_queryset', '_fields')
+
+    def __init__(self, item, base_queryset=None):
         """
 
-        :param dict:
+        :param item: projected list item
         :param base_queryset: CrunchbaseQueryset
-        :param kwargs:
         """
+        self.path, self.name, self.type = item.get('path'), item.get('name'), item.get('type')
         self.base_queryset = base_queryset
-        UserDict.__init__(self, dict, **kwargs)
+        self._fields = None
+
+    def __getitem__(self, key):
+        if key in LIST_ITEM_FIELDS:
+            return getattr(self, key)
+        # The default behaviour could change to simply return the key that was passed as fetch_value, rather than raising an
+        # exception, but that would make it harder to test
+        if key not in FIELD_EXTRACTORS:
+            raise KeyError(key)
+        if self._fields is None:  # All the fields are projected at once, so that the detail is only read once per item
+            self._fields = self.base_queryset.fetch_values(self)
+        return self._fields[key]
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return list(LIST_ITEM_FIELDS) + (list(self._fields) if self._fields else [])
+
+    def items(self):
+        return [(k, self[k]) for k in self.keys()]
+
+    def __contains__(self, key):
+        return key in LIST_ITEM_FIELDS or bool(self._fields and key in self._fields)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __eq__(self, other):
+        # Items are the same if their list fields are, whether the detail fields were fetched or not
+        try:
+            return all(self[k] == other[k] for k in LIST_ITEM_FIELDS)
+        except (KeyError, TypeError):
+            return False
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
 
-    def __missing__(self, key):
-        value = self.base_queryset.fetch_value(key, self)
-        self[key] = value
-        return value
+    def __repr__(self):
+        return '<CrunchbaseItem %s>' % self.path
 
 
 class CrunchbaseQueryset(collections.Sequence):
@@ -112,27 +803,55 @@ class CrunchbaseQueryset(collections.Sequence):
 
     def __init__(self, dataset=None, dataset_uri=None, allow_search=True):
         assert dataset or dataset_uri, "Either dataset_uri or dataset must be defined"  # dataset should only be used for testing
-        self._dataset = dataset
+        self._dataset = self.compact_page(dataset) if dataset else None
+        self._pages = PageLRU(getattr(settings, 'CRUNCHBASE_PAGE_LRU_BYTES', 8 * 1024 * 1024))
+        if dataset:
+            self._pages.set(dataset['data']['paging']['current_page'], self._dataset)
         self._dataset_uri = dataset_uri
         self.allow_search = allow_search
+        self._batch_paths = []  # Paths of the last slice, so that their details can be fetched together
+        self._item_values = {}  # Projected fields of the items, by path
+        self._cache_keys = set()  # Of the pages read so far
 
-    def get_dataset(self, cache_prefix='', **kwargs):
-        kwargs.update({'user_key': settings.CRUNCHBASE_USER_KEY})
-        cache_prefix = '-'.join([cache_prefix, str(kwargs.get('page', 1))])
-        cache_key = "%s-%s" % (cache_prefix, self._dataset_uri)
-        response = cache.get(cache_key)
-        if response is None:
-            response = requests.get(self._dataset_uri, params=kwargs)
-            # TODO: I suspect that setting the whole response in cache might cause problems with the cache value size
-            # since the actual response is roughly 200k in size. Still, apparently, in normal use everything gets properly
-            # cached, so...
-            cache.set(cache_key, response)
-        return response.json()
+    def get_dataset(self, cache_prefix='', dependency=True, **kwargs):
+        """
+        :param dependency: whether the page is one the current response is built from (eg. not a read-ahead); only these
+            are listed by cache_dependencies(), and only by the thread serving the request
+        :param kwargs: query parameters of the upstream request (eg. page)
+        """
+        cache_key = self.dataset_cache_key(kwargs.get('page', 1), cache_prefix)
+        family = 'search' if urlparse.urlparse(self._dataset_uri).query else 'list'
+        dataset = cached_get(cache_key, partial(fetch_list_page, self._dataset_uri, kwargs), family)
+        index_page(self._dataset_uri, kwargs.get('page', 1), dataset)
+        if dependency:
+            self._cache_keys.add(cache_key)
+        return dataset
+
+    def cache_dependencies(self):
+        """
+        :return: :rtype: list of the cache keys of the pages and the details read so far, or None if the items don't come
+            from the cache (eg. the results of a local search)
+        """
+        if not self._dataset_uri:
+            return None
+        return sorted(self._cache_keys) + sorted(self._item_values)
+
+    def dataset_cache_key(self, page, cache_prefix=''):
+        return "%s-%s-%s" % (cache_prefix, page, self._dataset_uri)
+
+    def compact_page(self, dataset):
+        """
+        :param dataset: projected list page
+        :return: a copy of the page, with CrunchbaseItem records bound to this queryset as items
+        """
+        data = dict(dataset['data'], items=[CrunchbaseItem(i, self) for i in dataset['data'].get('items', [])])
+        return {'metadata': dataset['metadata'], 'data': data}
 
     @property
     def dataset(self):
         if not self._dataset:  # We initialize the dataset with the first page
-            self._dataset = self.get_dataset()
+            self._dataset = self.compact_page(self.get_dataset())
+            self._pages.set(1, self._dataset)
         return self._dataset
 
     @property
@@ -143,130 +862,187 @@ class CrunchbaseQueryset(collections.Sequence):
     def metadata(self):
         return self.dataset['metadata']
 
+    def get_page_items(self, page):
+        """
+        :param page: 1-based number of the upstream page
+        :return: :rtype: list
+        """
+        dataset = self._pages.get(page)
+        if dataset is None:  # Pages that were already decoded are reused, as long as they fit in the LRU
+            dataset = self.compact_page(self.get_dataset(page=page))
+            self._pages.set(page, dataset)
+        if dataset['data'].get('paging'):  # Not an error, so it can tell the total too
+            self._dataset = dataset
+        return dataset['data']['items']
+
+    def read_ahead(self, page, page_index):
+        """
+        Warms the cache with the next upstream page when an access gets close to the end of the current one, so that
+        paging through the results doesn't stall at page boundaries.
+
+        :param page: 1-based number of the upstream page that was accessed
+        :param page_index: index of the last accessed item within that page
+        """
+        threshold = getattr(settings, 'CRUNCHBASE_READ_AHEAD', 100)
+        if page_index < self.paging['items_per_page'] - threshold or page >= self.paging['number_of_pages']:
+            return
+        if self.dataset_cache_key(page + 1) not in cache:
+            get_detail_pool().apply_async(upstream.run_with_priority, (upstream.PREFETCH, self.get_dataset),
+                                          {'page': page + 1, 'dependency': False})
+
+    def first_access(self, index):
+        """
+        Fetches the upstream page of the first item accessed, rather than the first page, which would only be needed to
+        know the total; the size of the upstream pages is assumed to be the usual one until it's known.
+        """
+        start = index.start if isinstance(index, slice) else index
+        page = (start or 0) // UPSTREAM_PAGE_SIZE + 1 if (start or 0) >= 0 else 1
+        self.get_page_items(page)
+        if self._dataset and self._dataset['data']['paging']['items_per_page'] != UPSTREAM_PAGE_SIZE and page > 1:
+            self._dataset = None  # Wrong guess, better start from the first page
+
     def __getitem__(self, index):
+        if self._dataset is None:
+            self.first_access(index)
         per_page = self.paging['items_per_page']
         if isinstance(index, slice):
-            # TODO: Consider the multiple page scenario (eg. [500:1500]
-            start, stop, step = index.indices(self.paging['total_items'])
-            expected_start_page = int(ceil(start / per_page)) + 1
-            expected_end_page = int(ceil(stop / per_page)) + 1
-            if expected_start_page != self.paging['current_page']:
-                self._dataset = self.get_dataset(page=expected_start_page)
-            if expected_end_page > expected_start_page:
-                raise IndexError("Slicing across pages is not allowed")
-                # self.extend_dataset(expected_start_page, expected_end_page)
-            adjustment = (expected_start_page - 1) * per_page
-            adjusted_index = slice(start - adjustment, stop - adjustment, None)
-        else:
-            expected_start_page = int(ceil(index / per_page)) + 1
-            if expected_start_page != self.paging['current_page']:
-                self.get_dataset(page=expected_start_page)
-            adjusted_index = index - (expected_start_page - 1) * per_page
-        items = self.dataset['data']['items'][adjusted_index]
-        if isinstance(adjusted_index, slice):
-            return [CrunchbaseProxyObject(i, self) for i in items]
-        return CrunchbaseProxyObject(items, self)
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            items = []
+            if stop > start:
+                first_page, last_page = start // per_page + 1, (stop - 1) // per_page + 1
+                for page in range(first_page, last_page + 1):  # Slices can span several upstream pages
+                    offset = (page - 1) * per_page
+                    items.extend(self.get_page_items(page)[max(start - offset, 0):stop - offset])
+                self.read_ahead(last_page, stop - 1 - (last_page - 1) * per_page)
+            self._batch_paths = [i.path for i in items]
+            return items
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("Index out of range")
+        page = index // per_page + 1
+        page_index = index - (page - 1) * per_page
+        item = self.get_page_items(page)[page_index]
+        self.read_ahead(page, page_index)
+        return item
 
     def __len__(self):
         return self.paging['total_items']
 
-    def extend_dataset(self, start_page, end_page):
-        # This seems to work but I just can't bring myself to actually trust it, so I guess I'm gonna raise an exception instead
-        fetched_pages = int(len(self.dataset['data']['items']) / self.paging['items_per_page'])
-        for i in range(start_page + fetched_pages, end_page + 1):  # end_page is inclusive
-            ds = self.get_dataset(page=i)
-            self._dataset['data']['items'].extend(ds['data']['items'])
+    def iter_items(self, start=0, read_ahead=None):
+        """
+        Walks the items from the given position to the end, fetching the upstream pages in order while the next ones are
+        fetched in the background by the export pool; the pages don't go through the cache nor the local index, so that
+        exporting a whole subset takes the memory of a few pages and doesn't evict the entries the views use.
+
+        :param start: index of the first item
+        :param read_ahead: number of pages fetched ahead, defaults to CRUNCHBASE_EXPORT_READ_AHEAD
+        :return: :rtype: generator of projected list items
+        :raise Http404: if the first page is an error
+        """
+        if not self._dataset_uri:  # Eg. a local search, whose items are all in memory
+            for item in self.dataset['data']['items'][start:]:
+                yield dict((k, item[k]) for k in LIST_ITEM_FIELDS)
+            return
+        if read_ahead is None:
+            read_ahead = getattr(settings, 'CRUNCHBASE_EXPORT_READ_AHEAD', 2)
+        page, skip = start // UPSTREAM_PAGE_SIZE + 1, start % UPSTREAM_PAGE_SIZE
+        dataset = fetch_list_page(self._dataset_uri, {'page': page})
+        paging = dataset['data'].get('paging')
+        if paging is None:
+            raise Http404
+        if paging['items_per_page'] != UPSTREAM_PAGE_SIZE and page > 1:  # Wrong guess, count from the first page
+            page, skip = start // paging['items_per_page'] + 1, start % paging['items_per_page']
+            dataset = fetch_list_page(self._dataset_uri, {'page': page})
+        pending = collections.deque()
+        next_page = page + 1
+        while dataset is not None and dataset['data'].get('items'):
+            number_of_pages = (dataset['data'].get('paging') or {}).get('number_of_pages', 0)
+            while len(pending) < read_ahead and next_page <= number_of_pages:
+                pending.append(get_export_pool().apply_async(
+                    metrics.bind(upstream.run_with_priority),
+                    (upstream.PREFETCH, fetch_list_page, self._dataset_uri, {'page': next_page})))
+                next_page += 1
+            for item in dataset['data']['items'][skip:]:
+                yield item
+            skip, dataset = 0, pending.popleft().get() if pending else None
 
     def search(self, term):
         # CB does not allow queries on Products database, only on Companies, so we must deal with them differently
-        if self.allow_search:
+        if self.allow_search and not getattr(settings, 'CRUNCHBASE_PREFER_LOCAL_SEARCH', False):
             scheme, netloc, path, params, query, fragment = urlparse.urlparse(self._dataset_uri)
             qdict = QueryDict(query).copy()
-            qdict['query'] = term
+            qdict['query'] = normalize_query(term)  # So that the warmed results of the logged queries are found
             query = qdict.urlencode()
             return CrunchbaseQueryset(dataset_uri=urlparse.urlunparse((scheme, netloc, path, params, query, fragment)))
-        return self
+        return self.local_search(term)
 
-    def fetch_value(self, key, item):
+    def local_search(self, term):
         """
+        Searches the items of the pages fetched so far, through the local index
 
-        :param key: the key that requires fetching
-        :param item: the dictionary where the key was not found
+        :param term: free text
+        :return: :rtype: CrunchbaseQueryset
         """
+        items = get_index(self._dataset_uri).search(term)
+        paging = {'current_page': 1, 'number_of_pages': 1, 'items_per_page': max(len(items), 1), 'total_items': len(items)}
+        return CrunchbaseQueryset(dataset={'metadata': self.metadata, 'data': {'items': items, 'paging': paging}},
+                                  allow_search=False)
 
-        def get_primary_image(detail):
-            # Helper to deal with missing images and image base url
-            try:
-                image_path = detail['data']['relationships']['primary_image']['items'][0]['path']
-            except KeyError:
-                image_path = None
-            else:
-                image_path = detail['metadata']['image_path_prefix'] + image_path
-            return image_path
-
-        # The actual method should include ways to parse the keys of the values to be fetched, but we can work with a
-        # a map here
-        values_map = {
-            'properties__short_description': lambda detail: detail['data']['properties']['short_description'],
-            # In this case, I'm gonna use a shorthand, since the actual key would be unwieldy
-            'primary_image': get_primary_image
-        }
-        if key not in values_map:
-            raise KeyError
-        path = item['path']
-        response = cache.get(path)
-        if response is None:
-            response = requests.get(self.metadata['api_path_prefix'] + path,
-                                    params={'user_key': settings.CRUNCHBASE_USER_KEY})
-            cache.set(path, response)
-        item_details = response.json()
-        # The default behaviour could change to simply return the key that was passed as fetch_value, rather than raising an
-        # exception, but that would make it harder to test
+    def prefetch_values(self, items):
+        """
+        Fetches the details of the items at once and projects them into all the registered fields, so that the fields of
+        the items don't have to be fetched on first access
 
-        return values_map.get(key)(item_details)
+        :param items: iterable of the items of this queryset
+        """
+        missing = [item['path'] for item in items if item['path'] not in self._item_values]
+        if missing:
+            for path, detail in fetch_details(self.metadata['api_path_prefix'], missing).items():
+                self._item_values[path] = project_fields(detail)
+
+    def fetch_values(self, item):
+        """
+        Fetches the detail of the item and projects it into all the registered fields at once
+
+        :param item: the dictionary where a field was not found
+        :return: :rtype: dict
+        """
+        path = item['path']
+        if path not in self._item_values:
+            # The first missing value of a slice triggers the fetching of the whole slice, since the template is going to
+            # ask for the others right away
+            batch = [p for p in self._batch_paths if p not in self._item_values] if path in self._batch_paths else [path]
+            for batch_path, detail in fetch_details(self.metadata['api_path_prefix'], batch).items():
+                self._item_values[batch_path] = project_fields(detail)
+        return self._item_values[path]
 
 
 class CrunchbaseEndpoint(object):
     BASE_URI = 'http://api.crunchbase.com/v/2/'  # trailing slash, because the paths in the response data are like that
+    SEARCHABLE_URIS = ('organizations',)  # The others are searched through the local index
     uri = ''
     per_page = 10
 
     def __init__(self, uri):
         super(CrunchbaseEndpoint, self).__init__()
         self.uri = self.BASE_URI + uri
-        self.datastore = CrunchbaseQueryset(dataset_uri=self.uri)
+        self.datastore = CrunchbaseQueryset(dataset_uri=self.uri, allow_search=uri in self.SEARCHABLE_URIS)
 
-    def fetch_item_values(self, path, fetch_values):
+    def fetch_item_values(self, path, fetch_values, item_details=None):
         """
 
         :param path: item path as exposed in CrunchbaseEndpoint.list result
         :param fetch_values: iterable
+        :param item_details: the already decoded detail of the item, if available
         :return: :rtype: dict
+        :raise KeyError: if one of the values is not a registered field
         """
-
-        def get_primary_image(detail):
-            # Helper to deal with missing images and image base url
-            try:
-                image_path = detail['data']['relationships']['primary_image']['items'][0]['path']
-            except KeyError:
-                image_path = None
-            else:
-                image_path = detail['metadata']['image_path_prefix'] + image_path
-            return 'primary_image', image_path
-
-        # The actual method should include ways to parse the keys of the values to be fetched, but we can work with a
-        # a map here
-        values_map = {
-            'properties__short_description': lambda detail: ('properties__short_description',
-                                                             detail['data']['properties']['short_description']),
-            # In this case, I'm gonna use a shorthand, since the actual key would be unwieldy
-            'primary_image': get_primary_image
-        }
-        item_details = self.detail(path)
-        # The default behaviour could change to simply return the key that was passed as fetch_value, rather than raising an
-        # exception, but that would make it harder to test
-        item_values = [values_map.get(v)(item_details) for v in fetch_values]
-        return dict(item_values)
+        if item_details is None:
+            item_details = self.detail(path)
+        return project_fields(item_details, fetch_values)
 
     def list(self, per_page=None, page=0, raw=False, fetch_values=None):
         """
@@ -285,27 +1061,21 @@ class CrunchbaseEndpoint(object):
         # We're gonna work on the crunchbase page, so our index needs to be adjusted
         page_index = (page * per_page) - (1000 * crunchbase_page)
 
-        cache_key = "%s-%s" % (crunchbase_page, self.uri)
-        response = cache.get(cache_key)
-        if response is None:
-            response = requests.get(self.uri, params={'user_key': settings.CRUNCHBASE_USER_KEY, 'page': crunchbase_page + 1})
-            # TODO: I suspect that setting the whole response in cache might cause problems with the cache value size
-            # since the actual response is roughly 200k in size. Still, apparently, in normal use everything gets properly
-            # cached, so...
-            cache.set(cache_key, response)
+        if raw:  # In this case, we will return the actual output of the GET request, without any processing or caching
+            return upstream.get(self.uri, params={'page': crunchbase_page + 1})
 
-        if raw:  # In this case, we will return the actual output of the GET request, without any processing
-            return response
-
-        response_json = response.json()
+        # Same cache entry as the datastore's, so that the home page and the search pages share it
+        page_json = self.datastore.get_dataset(page=crunchbase_page + 1)
         # Annoyingly, CB API returns a 200 Ok status even for errors, so we have to dig into the result set and raise accordingly
-        self.handle_errors(response_json)
-        response_json['data']['items'] = response_json['data']['items'][page_index:page_index + per_page]
+        self.handle_errors(page_json)
+        items = [dict(item) for item in page_json['data']['items'][page_index:page_index + per_page]]
         # Instead of updating the original current_page value, we're adding a new one to allow further processing
-        response_json['data']['paging'].update({'per_page': per_page, 'page': page})
+        paging = dict(page_json['data']['paging'], per_page=per_page, page=page)
+        response_json = {'metadata': page_json['metadata'], 'data': {'items': items, 'paging': paging}}
         if fetch_values is not None:
-            for item in response_json['data']['items']:
-                item.update(self.fetch_item_values(item['path'], fetch_values))
+            details = fetch_details(self.BASE_URI, [item['path'] for item in items])
+            for item in items:
+                item.update(self.fetch_item_values(item['path'], fetch_values, details[item['path']]))
         return response_json
 
     def detail(self, path, raw=False):
@@ -315,14 +1085,9 @@ class CrunchbaseEndpoint(object):
 
         :param path: "Permalink" for the required resource in the form /resource/identifier (eg. /companies/virgil-security)
         """
-        response = cache.get(path)
-        if response is None:
-            response = requests.get(self.BASE_URI + path, params={'user_key': settings.CRUNCHBASE_USER_KEY})
-            cache.set(path, response)
-
         if raw:
-            return response
-        return response.json()
+            return upstream.get(self.BASE_URI + path)
+        return fetch_details(self.BASE_URI, [path])[path]
 
     def handle_errors(self, response_json):
         """
@@ -335,7 +1100,7 @@ class CrunchbaseEndpoint(object):
             raise Http404
 
 
-class CrunchbaseDetailView(TemplateView):
+class CrunchbaseDetailView(PageCacheMixin, TemplateView):
     # We're not using the default DetailView because at the moment it appears that most of its methods won't be necessary,
     # this may change later
     template_name = 'crunchbase/detail.html'
@@ -343,16 +1108,75 @@ class CrunchbaseDetailView(TemplateView):
 
     def get_object(self):
         path = self.kwargs.get('path')
-        response = requests.get(CrunchbaseEndpoint.BASE_URI + path, params={'user_key': settings.CRUNCHBASE_USER_KEY})
-        return response.json()
+        if use_mirror():
+            for model in MIRROR_MODELS.values():
+                try:
+                    return model.objects.get(path=path).get_detail()
+                except model.DoesNotExist:
+                    pass
+            # Items that were added after the mirror was last updated are still looked up upstream
+        detail = fetch_details(CrunchbaseEndpoint.BASE_URI, [path])[path]
+        if detail['data'].get('error'):
+            raise Http404
+        return detail
+
+    def page_cache_key(self):
+        return u'detail|%s' % self.kwargs.get('path')
+
+    def page_dependencies(self):
+        return [self.kwargs.get('path')]
 
     def get_context_data(self, **kwargs):
         context_data = super(CrunchbaseDetailView, self).get_context_data(**kwargs)
         context_data['object'] = self.object['data']
         context_data['metadata'] = self.object['metadata']
-        context_data['personnel'] = [x for x in self.object['data']['relationships']]
+        context_data['path'] = self.kwargs.get('path')  # For the fragment cache
+        context_data['primary_image'] = get_primary_image(self.object, 'detail')
+        relationships = self.object['data'].get('relationships', {})
+        context_data['personnel'] = relationships.get('current_team', {}).get('items', [])
+        context_data['news'] = relationships.get('news', {}).get('items', [])[:DETAIL_RELATIONSHIPS['news'][1]]
         return context_data
 
     def get(self, request, *args, **kwargs):
         self.object = self.get_object()
-        return super(CrunchbaseDetailView, self).get(request, *args, **kwargs)
\ No newline at end of file
+        return super(CrunchbaseDetailView, self).get(request, *args, **kwargs)
+
+
+class CrunchbaseThumbnailView(View):
+    """
+    Serves the local copy of an item image, resized to one of CRUNCHBASE_THUMBNAIL_SIZES; the copies never change, so
+    browsers and proxies are allowed to keep them for a year.
+    """
+    max_age = 365 * 24 * 3600
+
+    def get(self, request, size, path):
+        try:
+            file_path, etag, content_type = get_thumbnail(path, size)
+        except ThumbnailError:
+            raise Http404
+        if etag in [t.strip() for t in request.META.get('HTTP_IF_NONE_MATCH', '').split(',')]:
+            response = HttpResponseNotModified()
+        else:
+            try:
+                with open(file_path, 'rb') as f:
+                    response = HttpResponse(f.read(), content_type=content_type)
+            except IOError:  # Culled by another request in the meantime
+                raise Http404
+        response['ETag'] = etag
+        response['Cache-Control'] = 'public, max-age=%s' % self.max_age
+        return response
+
+
+class CrunchbaseMetricsView(View):
+    """
+    The counters of this process in the Prometheus text format, plus the current state of the rate limiter and of the
+    caches; only available to INTERNAL_IPS, or with DEBUG.
+    """
+    def get(self, request, *args, **kwargs):
+        if not settings.DEBUG and request.META.get('REMOTE_ADDR') not in settings.INTERNAL_IPS:
+            raise Http404
+        gauges = dict(('crunchbase_rate_limiter_%s' % k, v) for k, v in upstream.get_limiter().stats().items())
+        gauges['crunchbase_l1_cache_entries'] = len(cache._local)
+        gauges['crunchbase_in_flight_fetches'] = len(_flights)
+        text = metrics.registry.render() + ''.join('%s %s\n' % (k, repr(float(v))) for k, v in sorted(gauges.items()))
+        return HttpResponse(text, content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,120 @@
+"""
+Cache warming: refreshes the list pages, the details shown in the home page and the results of the most frequent
+searches before they expire, so that the users almost never wait for the API.
+"""
+from functools import partial
+import logging
+import threading
+from django.conf import settings
+from crunchbase import upstream
+from crunchbase.query_log import query_log
+from crunchbase.views import CrunchbaseQuery, CrunchbaseEndpoint, fetch_concurrently, fetch_list_page, fetch_once, \
+    fetch_projected, get_cached, index_page, project_detail
+
+logger = logging.getLogger(__name__)
+
+
+def warm_entry(cache_key, fetch, family):
+    """
+    Fetches the entry if it's missing or past its soft timeout, so that it never gets to the hard one; the fetch is
+    shared with the requests and with the other processes warming the same entry.
+
+    :return: the cached data
+    """
+    data, stale = get_cached(cache_key)
+    if data is None or stale:
+        data = fetch_once(cache_key, partial(upstream.run_with_priority, upstream.WARMING, fetch), family)
+    return data
+
+
+def warm_pages(endpoint, pages):
+    """
+    :param endpoint: CrunchbaseEndpoint
+    :param pages: number of upstream pages to warm, starting from the first
+    :return: :rtype: list of the warmed pages
+    """
+    warmed = []
+    for page in range(1, pages + 1):
+        page_json = warm_entry(endpoint.datastore.dataset_cache_key(page),
+                               partial(fetch_list_page, endpoint.uri, {'page': page}), 'list')
+        if page_json['data'].get('error'):
+            break
+        index_page(endpoint.uri, page, page_json)
+        warmed.append(page_json)
+        if page >= page_json['data']['paging']['number_of_pages']:
+            break
+    return warmed
+
+
+def warm_details(paths):
+    fetch_concurrently([partial(warm_entry, path, partial(fetch_projected, CrunchbaseEndpoint.BASE_URI + path, project_detail),
+                                'detail') for path in paths])
+
+
+def warm_query(subset, query):
+    datastore = getattr(CrunchbaseQuery(), subset).datastore
+    if not datastore.allow_search or getattr(settings, 'CRUNCHBASE_PREFER_LOCAL_SEARCH', False):
+        return  # Searched in the local index, nothing to fetch
+    results = datastore.search(query)
+    warm_entry(results.dataset_cache_key(1), partial(fetch_list_page, results._dataset_uri, {}), 'search')
+
+
+def warm(pages=None, home_details=None, queries=None):
+    """
+    Warms the configured sets of entries; the arguments default to the CRUNCHBASE_WARMING setting.
+
+    :param pages: number of upstream pages of each subset
+    :param home_details: whether to warm the details of the items shown in the home page
+    :param queries: number of the most frequent recent searches
+    """
+    options = getattr(settings, 'CRUNCHBASE_WARMING', {})
+    pages = options.get('pages', 1) if pages is None else pages
+    home_details = options.get('home_details', True) if home_details is None else home_details
+    queries = options.get('queries', 20) if queries is None else queries
+    for subset in sorted(CrunchbaseQuery.ENDPOINTS):
+        endpoint = getattr(CrunchbaseQuery(), subset)
+        warmed = warm_pages(endpoint, max(pages, 1 if home_details else 0))
+        if home_details and warmed:
+            warm_details([item['path'] for item in warmed[0]['data']['items'][:CrunchbaseEndpoint.per_page]])
+    for (subset, query), count in query_log.most_common(queries):
+        warm_query(subset, query)
+
+
+class WarmingScheduler(threading.Thread):
+    """
+    Runs warm() in the background every `interval` seconds, which should be shorter than the difference between the hard
+    and the soft timeouts in CRUNCHBASE_CACHE_TIMEOUTS
+    """
+    daemon = True
+
+    def __init__(self, interval, **options):
+        super(WarmingScheduler, self).__init__(name='crunchbase-warming')
+        self.interval = interval
+        self.options = options
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                warm(**self.options)
+            except Exception:
+                logger.exception("Cache warming failed")
+            self.stopped.wait(self.interval)
+
+    def stop(self):
+        self.stopped.set()
+
+
+def start_scheduler():
+    """
+    Starts the background warming of this process, if CRUNCHBASE_WARM_INTERVAL is set; it's called by the WSGI module,
+    so that only the processes serving requests warm the cache, and not the management commands or the tests.
+
+    :return: :rtype: WarmingScheduler or None
+    """
+    interval = getattr(settings, 'CRUNCHBASE_WARM_INTERVAL', None)
+    if not interval:
+        return None
+    scheduler = WarmingScheduler(interval)
+    scheduler.start()
+    return scheduler
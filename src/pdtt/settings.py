@@ -10,6 +10,8 @@ https://docs.djangoproject.com/en/1.7/ref/settings/
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 import os
+import sys
+import tempfile
 BASE_DIR = os.path.dirname(os.path.dirname(__file__))
 
 
@@ -24,6 +26,8 @@ DEBUG = True
 
 TEMPLATE_DEBUG = True
 
+INTERNAL_IPS = ('127.0.0.1',)  # Allowed to read /metrics/
+
 ALLOWED_HOSTS = []
 
 
@@ -40,6 +44,8 @@ INSTALLED_APPS = (
 )
 
 MIDDLEWARE_CLASSES = (
+    'crunchbase.middleware.UpstreamUnavailableMiddleware',
+    'crunchbase.middleware.MetricsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -85,17 +91,91 @@ TEMPLATE_DIRS = [
     os.path.join(BASE_DIR, 'templates')
 ]
 
+# Templates are compiled once per process; restart the server to see template changes
+TEMPLATE_LOADERS = (
+    ('django.template.loaders.cached.Loader', (
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    )),
+)
+
+# This is the shared second tier of crunchbase.tiered_cache, so that the workers don't keep a copy each. The file based
+# backend is only meant for development: every set() lists the whole directory to cull it, so it's kept small, and its
+# add() is not atomic, so the cross-process fetch and refresh locks are best-effort (two processes can occasionally
+# fetch the same entry). In production, use memcached in the local settings, eg.
+#
+# CACHES = {
+#     'default': {
+#         'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',  # Needs python-memcached
+#         'LOCATION': '127.0.0.1:11211',
+#         'TIMEOUT': 3600,
+#     }
+# }
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'unique-snowflake',
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'pdtt-cache'),
         'TIMEOUT': 3600,  # Reasonably high timeout, since the data is not going to change all that much
+        'OPTIONS': {'MAX_ENTRIES': 3000},  # Enough for a few list pages and the details browsed in development
     }
 }
 
 STATIC_URL = '/static/'
 CRUNCHBASE_USER_KEY = 'PLEASE SET IN LOCAL SETTINGS'
+CRUNCHBASE_FETCH_WORKERS = 10  # Max number of concurrent detail requests (a home page needs 10 per subset)
+CRUNCHBASE_EXPORT_WORKERS = 4  # Max number of concurrent requests of the exports, apart from those of the pages
+CRUNCHBASE_POOL_SIZE = 14  # Keep-alive connections per process, should be at least the two numbers of workers above
+CRUNCHBASE_CONNECT_TIMEOUT = 3.05
+CRUNCHBASE_READ_TIMEOUT = 10
+CRUNCHBASE_RATE_LIMIT = 10  # Upstream requests per second, for each process
+CRUNCHBASE_RATE_BURST = 20
+CRUNCHBASE_PAGE_TIMEOUT = 20  # Overall time allowed for the concurrent fetches of a page
+CRUNCHBASE_READ_AHEAD = 100  # Prefetch the next upstream page when accessing one of the last N items of a page
+CRUNCHBASE_PAGE_LRU_BYTES = 8 * 1024 * 1024  # Decoded upstream pages kept by each queryset
+CRUNCHBASE_STREAM_LIST_PAGES = True  # Decode list pages incrementally (requires ijson with the yajl2 library)
+# Serve the views from the copy in the database, filled by `manage.py mirror_crunchbase`
+CRUNCHBASE_USE_MIRROR = False
+CRUNCHBASE_PREFER_LOCAL_SEARCH = False  # Search companies in the local index of the fetched pages too, instead of upstream
+# (soft, hard) timeouts of each kind of entry: after the soft one they are served while being refreshed in the background
+CRUNCHBASE_CACHE_TIMEOUTS = {
+    'list': (1800, 6 * 3600),
+    'search': (600, 3600),
+    'detail': (6 * 3600, 24 * 3600),
+}
+CRUNCHBASE_L1_TIMEOUT = 60  # Decoded entries are kept in each process for this long at most
+CRUNCHBASE_L1_MAX_ENTRIES = 500
+# What warm() and `manage.py warm_crunchbase` keep fresh
+CRUNCHBASE_WARMING = {
+    'pages': 2,  # First N upstream pages of each subset
+    'home_details': True,
+    'queries': 20,  # Most frequent recent searches
+}
+CRUNCHBASE_WARM_INTERVAL = None  # Seconds; if set, each server process warms the cache in a background thread
+# Item images are served from local copies, resized to the widths they are rendered at (with PIL, if installed)
+CRUNCHBASE_IMAGE_URI = 'http://images.crunchbase.com/'
+CRUNCHBASE_THUMBNAIL_DIR = os.path.join(tempfile.gettempdir(), 'pdtt-thumbnails')
+CRUNCHBASE_THUMBNAIL_SIZES = {'row': 200, 'detail': 400}
+CRUNCHBASE_THUMBNAIL_MAX_FILES = 20000  # The oldest thumbnails are removed beyond this
+# Rendered pages are cached until one of the entries they were built from is refreshed
+CRUNCHBASE_PAGE_CACHE = True
+CRUNCHBASE_PAGE_CACHE_TIMEOUT = 3600
+CRUNCHBASE_FRAGMENT_CACHE_TIMEOUT = 6 * 3600  # Rows and detail sections, keyed by the version of their data
+CRUNCHBASE_SERVER_TIMING = False  # Sends the split of each request duration in a Server-Timing header
+CRUNCHBASE_SLOW_REQUEST_SECONDS = 2  # Requests taking longer are logged with their split; None to disable
+CRUNCHBASE_EXPORT_READ_AHEAD = 2  # Upstream pages fetched ahead of the one being streamed by the export API
+CRUNCHBASE_EXPORT_BATCH_SIZE = 50  # Items whose details are fetched together by the export API
+CRUNCHBASE_COMPRESSED_FAMILIES = ('detail',)  # Cache entries stored zlib-compressed in the shared backend
 try:
     from local_settings import *
 except ImportError:
     pass
+
+if sys.argv[1:2] == ['test']:
+    # The tests write fixtures under the keys the views read, so they get a cache of their own, which they clear
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'pdtt-tests',
+            'TIMEOUT': 3600,
+        }
+    }
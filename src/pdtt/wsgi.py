@@ -12,3 +12,7 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "pdtt.settings")
 
 from django.core.wsgi import get_wsgi_application
 application = get_wsgi_application()
+
+# Imported by the servers only (runserver included), so the cache is not warmed by the other management commands
+from crunchbase.warming import start_scheduler
+start_scheduler()